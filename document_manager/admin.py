@@ -1,3 +1,9 @@
 from django.contrib import admin
 
-# Register your models here.
+from document_manager.models import SiteSetting
+
+
+@admin.register(SiteSetting)
+class SiteSettingAdmin(admin.ModelAdmin):
+    list_display = ("key", "value", "updated_at")
+    search_fields = ("key",)
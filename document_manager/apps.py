@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DocumentManagerConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'document_manager'
+
+    def ready(self):
+        from document_manager import signals  # noqa: F401
@@ -1,5 +1,6 @@
 import os
 from django import forms
+from django.conf import settings
 from .models import Document
 from django.core.exceptions import ValidationError
 
@@ -13,7 +14,8 @@ def validate_document_extension(value):
             f"Unsupported file type '{ext}'. Allowed types are: PDF, DOC, DOCX, TXT."
         )
 
-def validate_max_file_size(value, max_size_mb=10):
+def validate_max_file_size(value, max_size_mb=None):
+    max_size_mb = max_size_mb or settings.MAX_UPLOAD_SIZE_MB
     max_size_bytes = max_size_mb * 1024 * 1024
     if value.size > max_size_bytes:
         raise ValidationError(
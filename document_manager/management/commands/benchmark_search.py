@@ -0,0 +1,169 @@
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client.http import models as rest
+
+from document_manager.vector_store import get_vector_store
+
+QUANTIZATION_MODES = {
+    # search the original vectors only
+    "ignore": rest.QuantizationSearchParams(ignore=True),
+    # quantized candidates, rescored against the originals
+    "rescore": rest.QuantizationSearchParams(rescore=True, oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING),
+    # quantized scores only
+    "no-rescore": rest.QuantizationSearchParams(rescore=False),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures recall@k and latency of the configured vector store against exact "
+        "NumPy ground truth for combinations of hnsw_ef, quantization and filtering. "
+        "hnsw_ef and quantization only affect the Qdrant backend."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=100, help="number of chunk vectors used as queries")
+        parser.add_argument("--k", type=int, default=10)
+        parser.add_argument("--ef", default="16,64,128,256", help="comma-separated hnsw_ef values")
+        parser.add_argument("--quantization", default="ignore,rescore,no-rescore",
+                            help=f"comma-separated modes from {', '.join(QUANTIZATION_MODES)}")
+        parser.add_argument("--filters", default="none,owner",
+                            help="'none' searches everything, 'owner' filters to the query chunk's owner")
+        parser.add_argument("--max-points", type=int, default=200000,
+                            help="refuse to load more vectors than this for ground truth")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--output", default="benchmark_search.json", help="JSON results path")
+
+    def handle(self, *args, **options):
+        k = options["k"]
+        ef_values = [int(v) for v in options["ef"].split(",") if v]
+        modes = [m for m in options["quantization"].split(",") if m]
+        filters = [f for f in options["filters"].split(",") if f]
+        for mode in modes:
+            if mode not in QUANTIZATION_MODES:
+                raise CommandError(f"Unknown quantization mode {mode}")
+        for name in filters:
+            if name not in ("none", "owner"):
+                raise CommandError(f"Unknown filter {name}")
+
+        ids, owners, vectors = self.load_vectors(options["max_points"])
+        if len(ids) < k:
+            raise CommandError(f"Collection has {len(ids)} points, need at least k={k}")
+        self.stdout.write(f"Loaded {len(ids)} vectors from {settings.CHUNKS_COLLECTION_NAME}")
+
+        rng = np.random.default_rng(options["seed"])
+        sample = rng.choice(len(ids), size=min(options["queries"], len(ids)), replace=False)
+        truth = {name: self.ground_truth(vectors, owners, ids, sample, k, name) for name in filters}
+
+        runs = []
+        for filter_name in filters:
+            for mode in modes:
+                for ef in ef_values:
+                    run = self.measure(vectors, owners, ids, sample, truth[filter_name], k, ef, mode, filter_name)
+                    runs.append(run)
+            # exact search as a sanity baseline: recall should be ~1.0
+            runs.append(self.measure(vectors, owners, ids, sample, truth[filter_name], k, None, "ignore", filter_name, exact=True))
+
+        self.print_table(runs, k)
+
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "collection": settings.CHUNKS_COLLECTION_NAME,
+            "points": len(ids),
+            "queries": len(sample),
+            "k": k,
+            "backend": settings.VECTOR_STORE_BACKEND,
+            "collection_config": {
+                "quantization": settings.QDRANT_QUANTIZATION,
+                "vectors_on_disk": settings.QDRANT_VECTORS_ON_DISK,
+                "hnsw_m": settings.QDRANT_HNSW_M,
+                "hnsw_ef_construct": settings.QDRANT_HNSW_EF_CONSTRUCT,
+            },
+            "runs": runs,
+        }
+        with open(options["output"], "w") as f:
+            json.dump(report, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {options['output']}"))
+
+    def load_vectors(self, max_points: int):
+        """
+        Scrolls every chunk point with its vector and owner.
+        Returns (ids, owner ids, L2-normalized float32 matrix).
+        """
+        store = get_vector_store()
+        ids, owners, vectors = [], [], []
+        for point in store.scroll(store.chunks_collection):
+            if point["vector"]:
+                ids.append(point["id"])
+                owners.append(point["payload"].get("owner_id"))
+                vectors.append(point["vector"])
+            if len(ids) > max_points:
+                raise CommandError(f"More than {max_points} points; raise --max-points if there is enough memory")
+
+        matrix = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return np.asarray(ids), np.asarray(owners), matrix / norms
+
+    def ground_truth(self, vectors, owners, ids, sample, k, filter_name) -> list[set]:
+        """
+        Exact top-k point ids per query by cosine similarity, restricted to the
+        query owner's points for the "owner" filter (fewer than k if the owner has fewer).
+        """
+        truth = []
+        for i in sample:
+            # only rows the filtered search may return; an owner can have fewer than k
+            rows = np.flatnonzero(owners == owners[i]) if filter_name == "owner" else np.arange(len(ids))
+            scores = vectors[rows] @ vectors[i]
+            n = min(k, len(rows))
+            top = rows[np.argpartition(-scores, n - 1)[:n]]
+            truth.append(set(ids[top].tolist()))
+        return truth
+
+    def measure(self, vectors, owners, ids, sample, truth, k, ef, mode, filter_name, exact=False) -> dict:
+        store = get_vector_store()
+        latencies = []
+        recalls = []
+        for i, expected in zip(sample, truth):
+            filters = {"owner_id": int(owners[i])} if filter_name == "owner" else None
+            started = time.perf_counter()
+            hits = store.search(
+                store.chunks_collection,
+                vectors[i].tolist(),
+                top_k=k,
+                filters=filters,
+                hnsw_ef=ef,
+                exact=exact,
+                quantization=QUANTIZATION_MODES[mode],
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            found = {hit["id"] for hit in hits}
+            recalls.append(len(found & expected) / len(expected))
+
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        return {
+            "filter": filter_name,
+            "quantization": mode,
+            "hnsw_ef": ef,
+            "exact": exact,
+            f"recall@{k}": round(float(np.mean(recalls)), 4),
+            "p50_ms": round(float(p50), 2),
+            "p95_ms": round(float(p95), 2),
+            "p99_ms": round(float(p99), 2),
+        }
+
+    def print_table(self, runs: list, k: int):
+        header = f"{'filter':<8}{'quantization':<14}{'hnsw_ef':>8}{'recall@' + str(k):>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for run in runs:
+            ef = "exact" if run["exact"] else str(run["hnsw_ef"])
+            self.stdout.write(
+                f"{run['filter']:<8}{run['quantization']:<14}{ef:>8}{run[f'recall@{k}']:>12.4f}"
+                f"{run['p50_ms']:>10.2f}{run['p95_ms']:>10.2f}{run['p99_ms']:>10.2f}"
+            )
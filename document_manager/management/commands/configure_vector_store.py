@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from document_manager.qdrant.qdrant_client import configure_collection, qdrant_client
+from document_manager.vector_store import get_vector_store
+from document_manager.vector_store.qdrant_store import QdrantVectorStore
+
+
+class Command(BaseCommand):
+    help = (
+        "Applies the QDRANT_* storage settings (quantization, on-disk vectors, HNSW) to the "
+        "existing Qdrant collections. Qdrant re-optimizes them in the background; new "
+        "collections already get these settings when they are created."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--collection", action="append", dest="collections",
+                            help="collection to update (repeatable); defaults to the chunk and document collections")
+
+    def handle(self, *args, **options):
+        if not isinstance(get_vector_store(), QdrantVectorStore):
+            raise CommandError(f"{settings.VECTOR_STORE_BACKEND} is not the Qdrant backend; nothing to configure")
+
+        collections = options["collections"] or [settings.CHUNKS_COLLECTION_NAME, settings.DOCUMENT_COLLECTION_NAME]
+        existing = {c.name for c in qdrant_client().get_collections().collections}
+        missing = [name for name in collections if name not in existing]
+        if missing:
+            raise CommandError(f"Unknown collection(s): {', '.join(missing)}")
+
+        self.stdout.write(
+            f"quantization={settings.QDRANT_QUANTIZATION} vectors_on_disk={settings.QDRANT_VECTORS_ON_DISK} "
+            f"hnsw_m={settings.QDRANT_HNSW_M} hnsw_ef_construct={settings.QDRANT_HNSW_EF_CONSTRUCT} "
+            f"hnsw_on_disk={settings.QDRANT_HNSW_ON_DISK}"
+        )
+        for name in collections:
+            configure_collection(name)
+            self.stdout.write(self.style.SUCCESS(f"Updated {name}; Qdrant re-optimizes it in the background"))
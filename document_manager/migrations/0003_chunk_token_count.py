@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_manager', '0002_chunk_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chunk',
+            name='token_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
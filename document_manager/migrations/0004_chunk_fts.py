@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:05
+
+import logging
+
+from django.db import migrations
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = "document_manager_chunk_fts"
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        text, owner_id UNINDEXED, document_id UNINDEXED, tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON document_manager_chunk BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, text, owner_id, document_id)
+        VALUES (new.id, new.text,
+                (SELECT owner_id FROM document_manager_document WHERE id = new.document_id),
+                new.document_id);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON document_manager_chunk BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF text ON document_manager_chunk BEGIN
+        UPDATE {FTS_TABLE} SET text = new.text WHERE rowid = new.id;
+    END""",
+    f"""INSERT INTO {FTS_TABLE}(rowid, text, owner_id, document_id)
+        SELECT c.id, c.text, d.owner_id, c.document_id
+        FROM document_manager_chunk c JOIN document_manager_document d ON d.id = c.document_id
+        WHERE c.id NOT IN (SELECT rowid FROM {FTS_TABLE})""",
+]
+
+UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install_fts(apps, schema_editor):
+    # FTS5 is SQLite-only; other databases keep using the icontains backend
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in INSTALL_SQL:
+        schema_editor.execute(sql)
+
+
+def uninstall_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for sql in UNINSTALL_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_manager', '0003_chunk_token_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_fts, uninstall_fts),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_manager', '0004_chunk_fts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sitesetting',
+            name='value',
+            field=models.CharField(choices=[('openai', 'OpenAI'), ('ollama', 'Ollama'), ('local', 'Local (hashed n-grams, for testing)')], default='openai', max_length=50),
+        ),
+    ]
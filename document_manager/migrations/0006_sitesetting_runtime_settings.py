@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_manager', '0005_sitesetting_local_provider'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sitesetting',
+            name='value',
+            field=models.CharField(default='openai', max_length=100),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_manager', '0006_sitesetting_runtime_settings'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='searchevent',
+            name='score_type',
+            field=models.CharField(blank=True, choices=[('similarity', 'Similarity'), ('rank', 'Fused rank (RRF)')], max_length=20),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.exceptions import ValidationError
 from django.db import models
 from django.contrib.auth import get_user_model
 
@@ -61,22 +62,30 @@ class SiteSetting(models.Model):
     PROVIDER_CHOICES = [
         ("openai", "OpenAI"),
         ("ollama", "Ollama"),
+        ("local", "Local (hashed n-grams, for testing)"),
     ]
 
-    key = models.CharField(max_length=100, unique=True)  # e.g. "embedding_provider"
-    value = models.CharField(max_length=50, choices=PROVIDER_CHOICES, default="openai")
+    key = models.CharField(max_length=100, unique=True)  # e.g. "embedding_provider", see RUNTIME_SETTINGS
+    value = models.CharField(max_length=100, default="openai")
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.key}={self.value}"
 
+    def clean(self):
+        from document_manager.utilities.runtime_settings import parse_setting
+
+        try:
+            parse_setting(self.key, self.value)
+        except ValidationError as e:
+            raise ValidationError({"value": e.messages})
+
     @classmethod
     def get_provider(cls):
-        try:
-            s = cls.objects.get(key="embedding_provider")
-            return s.value
-        except cls.DoesNotExist:
-            return "openai"
+        # served from the in-process runtime settings cache, not a query per call
+        from document_manager.utilities.runtime_settings import runtime_settings
+
+        return runtime_settings.get("embedding_provider")
 
 class Chunk(models.Model):
     document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name="chunks")
@@ -85,12 +94,18 @@ class Chunk(models.Model):
     start_offset = models.IntegerField(null=True, blank=True)
     end_offset = models.IntegerField(null=True, blank=True)
     vector_id = models.CharField(max_length=64, blank=True)  # ID in Qdrant
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True)  # sha256 of normalized text
+    token_count = models.PositiveIntegerField(default=0)  # tokens as counted at chunking time
 
     class Meta:
         unique_together = ("document", "index")
 
 
 class SearchEvent(models.Model):
+    SCORE_TYPE_CHOICES = [
+        ("similarity", "Similarity"),
+        ("rank", "Fused rank (RRF)"),
+    ]
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL,on_delete=models.SET_NULL, null=True, blank=True)
     query = models.CharField(max_length=300)
@@ -98,6 +113,9 @@ class SearchEvent(models.Model):
     result_count = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     top_score = models.FloatField(null=True, blank=True)
+    # native hybrid search scores by fused rank (RRF), not cosine similarity;
+    # top_score values of different types are not comparable
+    score_type = models.CharField(max_length=20, choices=SCORE_TYPE_CHOICES, blank=True)
 
     def __str__(self):
         return f"{self.query} ({self.created_at:%Y-%m-%d %H:%M})"
\ No newline at end of file
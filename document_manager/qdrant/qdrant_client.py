@@ -1,33 +1,205 @@
+import asyncio
 import traceback
-from qdrant_client import QdrantClient
+import weakref
+from qdrant_client import AsyncQdrantClient, QdrantClient
 from qdrant_client.http import models as rest
 import os
 from django.conf import settings
 import numpy as np
+import logging
+from document_manager.utilities.clients import per_process
+logger = logging.getLogger(__name__)
 
 
-def qdrant_client() -> QdrantClient:
+def _client_options() -> dict:
+    options = {
+        "prefer_grpc": settings.QDRANT_PREFER_GRPC,
+        "grpc_port": settings.QDRANT_GRPC_PORT,
+        "timeout": settings.QDRANT_TIMEOUT,
+    }
     if settings.QDRANT_API_KEY:
-        return QdrantClient(url=f"http://{settings.QDRANT_HOST}:{settings.QDRANT_PORT}", api_key=settings.QDRANT_API_KEY)
-    return QdrantClient(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+        options.update(url=f"http://{settings.QDRANT_HOST}:{settings.QDRANT_PORT}", api_key=settings.QDRANT_API_KEY)
+    else:
+        options.update(host=settings.QDRANT_HOST, port=settings.QDRANT_PORT)
+    return options
+
+@per_process
+def qdrant_client() -> QdrantClient:
+    """
+    Process-wide Qdrant client; its HTTP connection pool (or gRPC channel with
+    QDRANT_PREFER_GRPC) is reused by every call in the process.
+    """
+    return QdrantClient(**_client_options())
+
+_async_clients = weakref.WeakKeyDictionary()
+
+def async_qdrant_client() -> AsyncQdrantClient:
+    """
+    AsyncQdrantClient for the running event loop (one per loop, like the async
+    embedding client), used by the async search views.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = AsyncQdrantClient(**_client_options())
+        _async_clients[loop] = client
+    return client
+
+
+SPARSE_VECTOR_NAME = "text"
+_sparse_support = {}
+_existing_collections = set()
+
+
+def _quantization_config():
+    mode = settings.QDRANT_QUANTIZATION
+    if mode == "scalar":
+        return rest.ScalarQuantization(
+            scalar=rest.ScalarQuantizationConfig(
+                type=rest.ScalarType.INT8,
+                quantile=0.99,
+                always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM,
+            )
+        )
+    if mode == "binary":
+        return rest.BinaryQuantization(
+            binary=rest.BinaryQuantizationConfig(always_ram=settings.QDRANT_QUANTIZATION_ALWAYS_RAM)
+        )
+    return None
+
+def _hnsw_config():
+    return rest.HnswConfigDiff(
+        m=settings.QDRANT_HNSW_M,
+        ef_construct=settings.QDRANT_HNSW_EF_CONSTRUCT,
+        on_disk=settings.QDRANT_HNSW_ON_DISK,
+    )
+
+def _dense_vector_params():
+    return rest.VectorParams(
+        size=settings.VECTOR_SIZE,
+        distance=rest.Distance.COSINE,
+        on_disk=settings.QDRANT_VECTORS_ON_DISK,
+    )
+
+def _search_params(hnsw_ef=None, exact=None, quantization=None) -> rest.SearchParams:
+    """
+    Per-query search parameters; unset arguments fall back to QDRANT_SEARCH_*.
+    With quantization the candidates are oversampled and rescored against the
+    originals, unless `quantization` (rest.QuantizationSearchParams) overrides it.
+    """
+    if quantization is None and settings.QDRANT_QUANTIZATION != "none":
+        quantization = rest.QuantizationSearchParams(
+            rescore=settings.QDRANT_QUANTIZATION_RESCORE,
+            oversampling=settings.QDRANT_QUANTIZATION_OVERSAMPLING,
+        )
+    return rest.SearchParams(
+        hnsw_ef=hnsw_ef if hnsw_ef is not None else settings.QDRANT_SEARCH_HNSW_EF,
+        exact=exact if exact is not None else settings.QDRANT_SEARCH_EXACT,
+        quantization=quantization,
+    )
+
+def configure_collection(collection_name: str):
+    """
+    Applies the QDRANT_* storage settings (quantization, on-disk vectors, HNSW)
+    to an existing collection. Qdrant rewrites the segments and rebuilds indexes
+    in the background, so this only runs from the configure_vector_store command,
+    never implicitly.
+    """
+    quantization = _quantization_config()
+    qdrant_client().update_collection(
+        collection_name=collection_name,
+        vectors_config={"": rest.VectorParamsDiff(on_disk=settings.QDRANT_VECTORS_ON_DISK)},
+        hnsw_config=_hnsw_config(),
+        quantization_config=quantization if quantization is not None else rest.Disabled.DISABLED,
+    )
 
 
 def ensure_collection():
+    """
+    Creates missing collections with the QDRANT_* storage settings; existing
+    collections are left as they are (see configure_collection).
+    Once both collections are known to exist the check is skipped for the
+    rest of the process.
+    """
+    wanted = {settings.CHUNKS_COLLECTION_NAME, settings.DOCUMENT_COLLECTION_NAME}
+    if wanted <= _existing_collections:
+        return
     client = qdrant_client()
     existing_collection_names = [c.name for c in client.get_collections().collections]
     if settings.CHUNKS_COLLECTION_NAME not in existing_collection_names:
+        sparse_config = None
+        if settings.QDRANT_SPARSE_ENABLED:
+            # lexical vectors for native hybrid search; Qdrant applies IDF at query time
+            sparse_config = {SPARSE_VECTOR_NAME: rest.SparseVectorParams(modifier=rest.Modifier.IDF)}
         client.recreate_collection(
             collection_name=settings.CHUNKS_COLLECTION_NAME,
-            vectors_config=rest.VectorParams(size=settings.VECTOR_SIZE, distance=rest.Distance.COSINE),
+            vectors_config=_dense_vector_params(),
+            sparse_vectors_config=sparse_config,
+            hnsw_config=_hnsw_config(),
+            quantization_config=_quantization_config(),
         )
+        _sparse_support.pop(settings.CHUNKS_COLLECTION_NAME, None)
+        # integer payload indexes for owner filtering and per-document grouping
+        for field in ("owner_id", "document_id"):
+            client.create_payload_index(
+                collection_name=settings.CHUNKS_COLLECTION_NAME,
+                field_name=field,
+                field_schema=rest.PayloadSchemaType.INTEGER,
+            )
     
     if settings.DOCUMENT_COLLECTION_NAME not in existing_collection_names:
         client.recreate_collection(
             collection_name=settings.DOCUMENT_COLLECTION_NAME,
-            vectors_config=rest.VectorParams(size=settings.VECTOR_SIZE, distance=rest.Distance.COSINE),
+            vectors_config=_dense_vector_params(),
+            hnsw_config=_hnsw_config(),
+            quantization_config=_quantization_config(),
         )
+        client.create_payload_index(
+            collection_name=settings.DOCUMENT_COLLECTION_NAME,
+            field_name="owner_id",
+            field_schema=rest.PayloadSchemaType.INTEGER,
+        )
+
+    _existing_collections.update(wanted)
+
+def chunks_support_sparse() -> bool:
+    """
+    Whether the chunks collection was created with the sparse lexical vector.
+    Collections created before sparse support need to be recreated (and
+    documents reindexed) to use native hybrid search. Memoized per process.
+    """
+    name = settings.CHUNKS_COLLECTION_NAME
+    if name not in _sparse_support:
+        try:
+            info = qdrant_client().get_collection(name)
+            sparse = info.config.params.sparse_vectors or {}
+            _sparse_support[name] = SPARSE_VECTOR_NAME in sparse
+        except Exception as e:
+            logger.warning("Could not read collection %s: %s", name, e)
+            return False
+    return _sparse_support[name]
+
+def build_filter(filters: dict = None):
+    """
+    rest.Filter from a {payload key: value or list of values} dict, or None.
+    """
+    if not filters:
+        return None
+    must = []
+    for key, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            must.append(rest.FieldCondition(key=key, match=rest.MatchAny(any=list(value))))
+        else:
+            must.append(rest.FieldCondition(key=key, match=rest.MatchValue(value=value)))
+    return rest.Filter(must=must)
 
-def upsert_document_vector(doc_id:int,doc_title:str, mean_vec:np.ndarray):
+def _dense_vector(vector):
+    # points in a collection with named sparse vectors come back as {"": dense, "text": sparse}
+    if isinstance(vector, dict):
+        return vector.get("")
+    return vector
+
+def upsert_document_vector(doc_id:int,doc_title:str, mean_vec:np.ndarray, owner_id:int=None):
 
     try:
         client = qdrant_client()
@@ -38,7 +210,7 @@ def upsert_document_vector(doc_id:int,doc_title:str, mean_vec:np.ndarray):
                 rest.PointStruct(
                     id=doc_id,  # reuse doc PK for stable mapping
                     vector=mean_vec,
-                    payload={"title": doc_title, "document_id":doc_id },
+                    payload={"title": doc_title, "document_id":doc_id, "owner_id": owner_id },
                 )
             ]
         )
@@ -66,23 +238,97 @@ def upsert_vector(chunk_id: int, embedding: list, payload: dict):
     except Exception as e:
         print(f"{traceback.format_exc()}")
         return -1
-        
 
-def search_vectors(query_embedding: list, top_k=10, filter_payload=None):
-    
-    client:QdrantClient = qdrant_client()
 
-    search_result = client.search(
-        collection_name=settings.CHUNKS_COLLECTION_NAME,
-        query_vector=query_embedding,
-        limit=top_k,
-        query_filter=filter_payload,  # Qdrant filter object, optional
-        with_payload=True,
-    )
+def upsert_vectors(points: list[tuple], batch_size: int = None, wait: bool = None,
+                   collection_name: str = None) -> list:
+    """
+    Bulk-inserts (point_id, embedding, payload) tuples into the chunks collection
+    (or `collection_name`).
+    A fourth element (indices, values) adds the sparse lexical vector when the
+    collection supports it.
+    Points are streamed in batches of `batch_size` over a single client.
+    When `wait` is False intermediate batches are acknowledged asynchronously and
+    only the last batch waits; Qdrant applies updates to a collection in order, so
+    the final acknowledgement acts as a consistency barrier for the whole run.
+    Returns the written point ids; raises RuntimeError listing every failed batch.
+    """
+    if not points:
+        return []
+
+    batch_size = batch_size or settings.QDRANT_UPSERT_BATCH_SIZE
+    if wait is None:
+        wait = settings.QDRANT_UPSERT_WAIT
+
+    collection_name = collection_name or settings.CHUNKS_COLLECTION_NAME
+    client = qdrant_client()
+    with_sparse = collection_name == settings.CHUNKS_COLLECTION_NAME and chunks_support_sparse()
+
+    def point_struct(point):
+        point_id, embedding, payload = point[:3]
+        vector = embedding
+        if with_sparse and len(point) > 3 and point[3] is not None:
+            indices, values = point[3]
+            vector = {"": embedding, SPARSE_VECTOR_NAME: rest.SparseVector(indices=indices, values=values)}
+        return rest.PointStruct(id=point_id, vector=vector, payload=payload)
+
+    batches = [points[i:i + batch_size] for i in range(0, len(points), batch_size)]
+    written = []
+    errors = []
+    for batch_no, batch in enumerate(batches):
+        is_last = batch_no == len(batches) - 1
+        try:
+            client.upsert(
+                collection_name=collection_name,
+                points=[point_struct(point) for point in batch],
+                wait=wait or is_last,
+            )
+            written.extend(point[0] for point in batch)
+        except Exception as e:
+            logger.error("Qdrant upsert failed for batch %d/%d (%d points): %s",
+                         batch_no + 1, len(batches), len(batch), e)
+            errors.append((batch_no, e))
+
+    if errors:
+        summary = ", ".join(f"batch {n + 1}: {e}" for n, e in errors)
+        raise RuntimeError(f"{len(errors)} of {len(batches)} upsert batches failed ({summary})")
+
+    return written
+
+
+def _search_request(query_embedding, top_k, filter_payload, group_by, group_size, score_threshold,
+                    search_params, collection_name) -> tuple[str, dict]:
+    """
+    (client method name, kwargs) for a dense search; shared by the sync and async clients.
+    """
+    common = {
+        "collection_name": collection_name or settings.CHUNKS_COLLECTION_NAME,
+        "limit": top_k,
+        "query_filter": filter_payload,  # Qdrant filter object, optional
+        "score_threshold": score_threshold,
+        "search_params": search_params,
+        "with_payload": True,
+    }
+    if group_by:
+        return "query_points_groups", {**common, "query": query_embedding, "group_by": group_by, "group_size": group_size}
+    return "search", {**common, "query_vector": query_embedding}
+
+def _search_response(result, grouped: bool) -> list:
+    if grouped:
+        return [
+            {
+                "group_id": group.id,
+                "hits": [
+                    {"id": hit.id, "score": hit.score, "payload": hit.payload}
+                    for hit in group.hits
+                ],
+            }
+            for group in result.groups
+        ]
 
     # Map to a simple list
     results = []
-    for hit in search_result:
+    for hit in result:
         results.append({
             "id": hit.id,
             "score": hit.score,
@@ -90,6 +336,94 @@ def search_vectors(query_embedding: list, top_k=10, filter_payload=None):
         })
     return results
 
+def search_vectors(query_embedding: list, top_k=10, filter_payload=None, group_by=None, group_size=3,
+                   score_threshold=None, hnsw_ef=None, exact=None, quantization=None, collection_name=None):
+    """
+    Dense search over chunks.
+    Without `group_by` returns the `top_k` best chunks as a flat list of
+    {"id", "score", "payload"}. With `group_by` (a payload key such as
+    "document_id") Qdrant groups server-side and returns up to `top_k` groups,
+    best first, as [{"group_id", "hits": [...]}] with at most `group_size` hits each.
+    `hnsw_ef` trades latency for recall; `exact` bypasses the index entirely;
+    `quantization` overrides the rescoring/oversampling defaults.
+    """
+    client:QdrantClient = qdrant_client()
+    method, kwargs = _search_request(query_embedding, top_k, filter_payload, group_by, group_size, score_threshold,
+                                     _search_params(hnsw_ef, exact, quantization), collection_name)
+    return _search_response(getattr(client, method)(**kwargs), grouped=bool(group_by))
+
+async def asearch_vectors(query_embedding: list, top_k=10, filter_payload=None, group_by=None, group_size=3,
+                          score_threshold=None, hnsw_ef=None, exact=None, quantization=None, collection_name=None):
+    """
+    Async counterpart of `search_vectors`.
+    """
+    client:AsyncQdrantClient = async_qdrant_client()
+    method, kwargs = _search_request(query_embedding, top_k, filter_payload, group_by, group_size, score_threshold,
+                                     _search_params(hnsw_ef, exact, quantization), collection_name)
+    return _search_response(await getattr(client, method)(**kwargs), grouped=bool(group_by))
+
+def _hybrid_request(query_embedding, query_sparse, top_k, filter_payload, score_threshold) -> dict:
+    indices, values = query_sparse
+    prefetch_limit = top_k * settings.HYBRID_PREFETCH_FACTOR
+
+    prefetch = [
+        rest.Prefetch(
+            query=query_embedding,
+            filter=filter_payload,
+            params=_search_params(),
+            limit=prefetch_limit,
+            score_threshold=score_threshold,
+        ),
+    ]
+    if indices:
+        prefetch.append(rest.Prefetch(
+            query=rest.SparseVector(indices=indices, values=values),
+            using=SPARSE_VECTOR_NAME,
+            filter=filter_payload,
+            limit=prefetch_limit,
+        ))
+
+    return {
+        "collection_name": settings.CHUNKS_COLLECTION_NAME,
+        "prefetch": prefetch,
+        "query": rest.FusionQuery(fusion=rest.Fusion.RRF),
+        "limit": top_k,
+        "with_payload": True,
+    }
+
+# Qdrant's server-side RRF scores a point 1 / (k + rank) per leg, with k=2 and 0-based ranks
+RRF_K = 2
+
+def _hybrid_response(response, legs: int) -> list:
+    # a first place in every leg scores legs / RRF_K
+    best_possible = legs / RRF_K
+    return [
+        {"id": hit.id, "score": hit.score / best_possible, "payload": hit.payload}
+        for hit in response.points
+    ]
+
+def hybrid_search_vectors(query_embedding: list, query_sparse: tuple, top_k=10, filter_payload=None,
+                          score_threshold=None):
+    """
+    Native hybrid search in one request: dense and sparse prefetches fused
+    server-side with reciprocal rank fusion. `score_threshold` applies to the
+    dense (cosine) leg only; the sparse leg has no threshold. Returned scores
+    are RRF scores scaled so a point ranked first by every leg scores 1.0,
+    e.g. first by one of two legs scores 0.5. They are rank-based, not cosine.
+    """
+    client:QdrantClient = qdrant_client()
+    kwargs = _hybrid_request(query_embedding, query_sparse, top_k, filter_payload, score_threshold)
+    return _hybrid_response(client.query_points(**kwargs), legs=len(kwargs["prefetch"]))
+
+async def ahybrid_search_vectors(query_embedding: list, query_sparse: tuple, top_k=10, filter_payload=None,
+                                 score_threshold=None):
+    """
+    Async counterpart of `hybrid_search_vectors`.
+    """
+    client:AsyncQdrantClient = async_qdrant_client()
+    kwargs = _hybrid_request(query_embedding, query_sparse, top_k, filter_payload, score_threshold)
+    return _hybrid_response(await client.query_points(**kwargs), legs=len(kwargs["prefetch"]))
+
 def delete_document_vectors(document_id: int):
     client = qdrant_client()
     # delete by payload filter
@@ -122,6 +456,40 @@ def delete_document_vectors(document_id:int):
         points_selector=selector,
     )
 
+def delete_vectors(point_ids: list, collection_name: str = None):
+    """
+    Deletes individual chunk points by id.
+    """
+    if not point_ids:
+        return
+    client = qdrant_client()
+    client.delete(
+        collection_name=collection_name or settings.CHUNKS_COLLECTION_NAME,
+        points_selector=rest.PointIdsList(points=point_ids),
+    )
+
+def delete_by_filter(collection_name: str, filter_payload: rest.Filter):
+    client = qdrant_client()
+    client.delete(
+        collection_name=collection_name,
+        points_selector=rest.FilterSelector(filter=filter_payload),
+    )
+
+def retrieve_vectors(point_ids: list, collection_name: str = None) -> dict:
+    """
+    Returns {point_id: vector} for the given chunk points.
+    """
+    if not point_ids:
+        return {}
+    client = qdrant_client()
+    points = client.retrieve(
+        collection_name=collection_name or settings.CHUNKS_COLLECTION_NAME,
+        ids=point_ids,
+        with_payload=False,
+        with_vectors=True,
+    )
+    return {p.id: _dense_vector(p.vector) for p in points if p.vector}
+
 def get_similar_documents(doc_vector:any, limit:int=5):
 
     client = qdrant_client()
@@ -134,6 +502,26 @@ def get_similar_documents(doc_vector:any, limit:int=5):
 
     return results
 
+def scroll_points(collection_name: str, filter_payload=None, with_vectors=True, batch_size=1000):
+    """
+    Yields every matching point as {"id", "vector", "payload"}.
+    """
+    client = qdrant_client()
+    next_offset = None
+    while True:
+        points, next_offset = client.scroll(
+            collection_name=collection_name,
+            scroll_filter=filter_payload,
+            with_payload=True,
+            with_vectors=with_vectors,
+            limit=batch_size,
+            offset=next_offset,
+        )
+        for p in points:
+            yield {"id": p.id, "vector": _dense_vector(p.vector) if with_vectors else None, "payload": p.payload}
+        if next_offset is None:
+            break
+
 def fetch_chunk_vectors_for_doc(client, collection_name, doc_id):
     vectors = []
     next_offset = None
@@ -159,7 +547,7 @@ def fetch_chunk_vectors_for_doc(client, collection_name, doc_id):
 
         for p in points:
             if p.vector:
-                vectors.append(p.vector)
+                vectors.append(_dense_vector(p.vector))
 
         if next_offset is None:
             break
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from document_manager.models import SiteSetting
+from document_manager.utilities.runtime_settings import runtime_settings
+
+
+@receiver([post_save, post_delete], sender=SiteSetting)
+def invalidate_runtime_settings(sender, **kwargs):
+    # after commit, so other processes never reload the old rows under the new version
+    transaction.on_commit(runtime_settings.invalidate)
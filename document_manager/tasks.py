@@ -1,103 +1,387 @@
 from django.conf import settings
 from django.utils import timezone
 import traceback
-from celery import shared_task
+from celery import chord, shared_task
 from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
 from .utilities.tokenizer import count_tokens
+from .utilities.search_cache import bump_index_version
+from .utilities.runtime_settings import get_runtime_setting
+from .utilities.services import reset_document_for_reindex
+from .utilities.sparse import sparse_document_vector
 
-from document_manager.utilities.embeddings import get_embedding
+from document_manager.utilities.embeddings import get_embeddings, get_provider_model
 
-from .models import Document, Chunk
-from .utilities.utils import extract_text_from_file
-from .utilities.chunking import chunk_text
-from pprint import pprint
-from .qdrant.qdrant_client  import ensure_collection, upsert_document_vector, upsert_vector
+from .models import Document, Chunk, SiteSetting
+from .utilities.utils import iter_text_segments
+from .utilities.chunking import chunk_hash, iter_chunks
+from .vector_store import get_vector_store
 import numpy as np
 import logging
 logger = logging.getLogger(__name__)
 
 
 
-def compute_mean_vector(embeddings):
-    """Chunks = queryset or list of obj with embedding."""
-    
-    vectors = np.array(embeddings)
-    mean_vec = np.mean(vectors, axis=0).tolist()
-    return mean_vec
+class CentroidAccumulator:
+    """
+    Running-sum mean of embedding vectors, so the centroid never needs
+    every chunk vector in memory at once.
+    """
 
+    def __init__(self):
+        self.total = None
+        self.count = 0
 
+    def add(self, embeddings):
+        if not len(embeddings):
+            return
+        batch_sum = np.asarray(embeddings, dtype=np.float64).sum(axis=0)
+        self.total = batch_sum if self.total is None else self.total + batch_sum
+        self.count += len(embeddings)
 
-@shared_task
-def process_document(document_id):
+    def mean(self):
+        if not self.count:
+            return None
+        return (self.total / self.count).tolist()
+
+
+def batched(iterable, size):
+    """Yields lists of up to `size` items from `iterable`."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class ProgressTracker:
+    """
+    Persists Document.progress only when it has advanced by at least
+    INDEXING_PROGRESS_STEP points, so long runs don't write on every step.
+    """
+
+    def __init__(self, doc, step=None):
+        self.doc = doc
+        self.step = step or settings.INDEXING_PROGRESS_STEP
+        self.saved = doc.progress
+
+    def update(self, progress:int, force=False):
+        progress = min(int(progress), 100)
+        if not force and progress - self.saved < self.step:
+            return
+        self.doc.progress = progress
+        Document.objects.filter(id=self.doc.id).update(progress=progress)
+        self.saved = progress
+
+
+
+def embed_and_store_chunks(doc, chunk_objs):
+    """
+    Embeds `chunk_objs`, upserts their vectors to Qdrant and records vector ids.
+    Returns the embeddings in the same order as `chunk_objs`.
+    """
+    if not chunk_objs:
+        return []
+
+    # one batched call per provider-sized group instead of one request per chunk
+    embeddings = get_embeddings(
+        [chunk.text for chunk in chunk_objs],
+        token_counts=[chunk.token_count for chunk in chunk_objs],
+    )
+    points = []
+    for chunk, embedding in zip(chunk_objs, embeddings):
+        payload = {
+            "owner_id":doc.owner_id,
+            "document_id": doc.id,
+            "chunk_id": chunk.id,
+            "title": doc.title,
+        }
+        if settings.QDRANT_STORE_CHUNK_TEXT:
+            payload["text"] = chunk.text
+        sparse = sparse_document_vector(chunk.text) if settings.QDRANT_SPARSE_ENABLED else None
+        points.append((chunk.id, embedding, payload, sparse))
+
+    get_vector_store().upsert(settings.CHUNKS_COLLECTION_NAME, points)
+    bump_index_version(doc.owner_id)
+
+    # point ids are the chunk primary keys, so vector ids are known once upserted
+    for chunk in chunk_objs:
+        chunk.vector_id = chunk.id
+    with transaction.atomic():
+        Chunk.objects.bulk_update(chunk_objs, ["vector_id"], batch_size=settings.CHUNK_BULK_BATCH_SIZE)
 
+    return embeddings
+
+
+def sync_chunks_incrementally(doc, chunks, provider: str = None):
+    """
+    Diffs freshly produced `chunks` against the stored chunks by content hash.
+    Unchanged chunks keep their row and Qdrant point (only index/offsets are
+    updated) and new ones are created without vectors. Vanished ones are parked
+    on negative indexes but keep their row and point, so the old passage stays
+    searchable until finalize_document deletes it once its replacement is stored.
+    `provider` selects how missing token counts are estimated.
+    Returns (all chunk objects in document order, new chunk objects, kept chunk objects,
+    vanished chunk objects).
+    """
+    stored = {}
+    for chunk in Chunk.objects.filter(document=doc).order_by("index"):
+        if not chunk.vector_id:
+            # never made it to Qdrant; treat as changed
+            stored.setdefault(None, []).append(chunk)
+            continue
+        stored.setdefault(chunk.content_hash or chunk_hash(chunk.text), []).append(chunk)
+
+    kept = []
+    new = []
+    ordered = []
+    for c in chunks:
+        h = chunk_hash(c['text'])
+        candidates = stored.get(h)
+        if candidates:
+            chunk = candidates.pop(0)
+            chunk.content_hash = h
+            kept.append(chunk)
+        else:
+            chunk = Chunk(document=doc, text=c['text'], content_hash=h,
+                          token_count=c.get('token_count') or count_tokens(c['text'], provider))
+            new.append(chunk)
+        chunk.index = c['index']
+        chunk.start_offset = c['start']
+        chunk.end_offset = c['end']
+        ordered.append(chunk)
+
+    vanished = [chunk for group in stored.values() for chunk in group]
+
+    with transaction.atomic():
+        # move kept and vanished rows to unique negative indexes first so reordering
+        # never trips the (document, index) unique constraint; vanished rows stay there
+        final_indexes = [chunk.index for chunk in kept]
+        lowest = Chunk.objects.filter(document=doc, index__lt=0).order_by("index").values_list("index", flat=True).first() or 0
+        for n, chunk in enumerate(kept + vanished):
+            chunk.index = lowest - (n + 1)
+        Chunk.objects.bulk_update(kept + vanished, ["index"], batch_size=settings.CHUNK_BULK_BATCH_SIZE)
+        for chunk, index in zip(kept, final_indexes):
+            chunk.index = index
+        Chunk.objects.bulk_update(
+            kept, ["index", "start_offset", "end_offset", "content_hash"],
+            batch_size=settings.CHUNK_BULK_BATCH_SIZE,
+        )
+        new = Chunk.objects.bulk_create(new, batch_size=settings.CHUNK_BULK_BATCH_SIZE)
+
+    logger.info(f"Incremental reindex of document {doc.id}: kept {len(kept)}, new {len(new)}, removed {len(vanished)}")
+    return ordered, new, kept, vanished
+
+
+@shared_task(bind=True)
+def process_document(self, document_id, incremental=False):
+    """
+    Ingestion entry point: extracts and chunks the document, then fans the
+    embedding work out as a chord of `embed_chunk_batch` tasks whose results
+    are combined by `finalize_document`.
+    With `incremental=True` existing chunks whose content is unchanged keep
+    their vectors, so only added or edited text is embedded.
+    """
 
     logger.info(f"Chunking document {document_id}")
     doc = Document.objects.get(id=document_id)
 
+    provider = SiteSetting.get_provider()
+    model = get_provider_model(provider)
+    if incremental and doc.embedding_model != model:
+        # stored vectors live in another embedding space; none of them can be reused
+        logger.info(f"Document {document_id}: embedding model changed from {doc.embedding_model!r} to {model!r}, re-embedding everything")
+        reset_document_for_reindex(doc, incremental=False)
+        incremental = False
     doc.status = "indexing"
-    doc.embedding_model = settings.EMBEDDING_PROVIDER
+    doc.embedding_model = model
     doc.save(update_fields=["status", "embedding_model"])
 
     try:
-        # Extract
-        text = extract_text_from_file(doc.file.path)
+        # Extract and chunk as a stream: pages/paragraphs feed the chunker and
+        # chunk rows are written a window at a time, so memory stays flat
+        fraction_done = 0.0
+        preview = []
+        preview_len = 0
+
+        def pieces():
+            nonlocal preview_len, fraction_done
+            for piece, fraction_done in iter_text_segments(doc.file.path):
+                if preview_len < settings.CONTENT_TEXT_MAX_CHARS:
+                    preview.append(piece[:settings.CONTENT_TEXT_MAX_CHARS - preview_len])
+                    preview_len += len(preview[-1])
+                yield piece
+
+        if get_runtime_setting("chunking_mode") == "tokens":
+            chunks = iter_chunks(pieces(), max_tokens=get_runtime_setting("chunk_max_tokens"),
+                                 overlap_tokens=get_runtime_setting("chunk_overlap_tokens"))
+        else:
+            chunks = iter_chunks(pieces(), max_chars=get_runtime_setting("chunk_max_chars"),
+                                 overlap=get_runtime_setting("chunk_overlap_chars"))
+        progress = ProgressTracker(doc)
+        window_size = settings.INGEST_WINDOW_CHUNKS
+        get_vector_store().ensure_collections()
+
+        # work carried over to finalize_document without re-embedding
+        kept = {"sum": None, "count": 0, "tokens": 0, "vanished": []}
+        batches = []
+
+        if incremental:
+            # the diff needs the full chunk list, but only text, not vectors
+            _, new_chunks, kept_chunks, vanished_chunks = sync_chunks_incrementally(doc, list(chunks), provider)
+            centroid = CentroidAccumulator()
+            for window in batched(kept_chunks, window_size):
+                vectors = get_vector_store().retrieve(settings.CHUNKS_COLLECTION_NAME, [int(chunk.vector_id) for chunk in window])
+                if len(vectors) != len(window):
+                    raise RuntimeError(f"Expected {len(window)} stored vectors for document {doc.id}, found {len(vectors)}")
+                centroid.add(list(vectors.values()))
+            kept = {
+                "sum": centroid.total.tolist() if centroid.count else None,
+                "count": centroid.count,
+                "tokens": sum(chunk.token_count or count_tokens(chunk.text, provider) for chunk in kept_chunks),
+                "vanished": [chunk.id for chunk in vanished_chunks],
+            }
+            batches = [[chunk.id for chunk in window] for window in batched(new_chunks, window_size)]
+        else:
+            if Chunk.objects.filter(document=doc).exists():
+                # redelivered after a worker crash (acks_late): clear the interrupted
+                # run instead of tripping the (document, index) unique constraint
+                logger.info(f"Document {document_id}: removing chunks of an interrupted run")
+                get_vector_store().delete_document(doc.id)
+                Chunk.objects.filter(document=doc).delete()
+            for window in batched(chunks, window_size):
+                chunk_objs = [
+                    Chunk(document=doc, index=c['index'], text=c['text'], start_offset=c['start'],
+                          end_offset=c['end'], content_hash=chunk_hash(c['text']),
+                          token_count=c.get('token_count') or count_tokens(c['text'], provider))
+                    for c in window
+                ]
+                with transaction.atomic():
+                    chunk_objs = Chunk.objects.bulk_create(chunk_objs, batch_size=settings.CHUNK_BULK_BATCH_SIZE)
+                batches.append([chunk.id for chunk in chunk_objs])
+                progress.update(5 + fraction_done * 35)
+
         with transaction.atomic():
-            doc.content_text = text
+            doc.content_text = "".join(preview)
             doc.save(update_fields=["content_text"])
-        
-        # Chunking
-        chunks = chunk_text(text, max_chars=1200)
-        chunk_objs = []
-        for c in chunks:
-            chunk_objs.append(Chunk.objects.create(document=doc, index=c['index'], text=c['text'], start_offset=c['start'], end_offset=c['end']))
-
-        ensure_collection()
-        total = len(chunk_objs)
-        total_tokens = 0
-        embeddings = []
-        for idx,chunk in enumerate(chunk_objs):
-            embedding = get_embedding(chunk.text)  # dispatches to OpenAI or Ollama
-            total_tokens += count_tokens(chunk.text)
-            payload = {
-                "owner_id":doc.owner_id,
-                "document_id": doc.id,
-                "chunk_id": chunk.id,
-                "title": doc.title,
-            }
-            pprint(payload)
-            point_id = upsert_vector(chunk_id=chunk.id, embedding=embedding, payload=payload)
-            chunk.vector_id = point_id
-            chunk.save(update_fields=["vector_id"])
-            embeddings.append(embedding)
-
-            doc.progress = 40 + int((idx / total) * 50)
-            doc.save(update_fields=["progress"])
-        
-        # after chunk embeddings stored:
-        chunks = Chunk.objects.filter(document_id=doc.id)
-        mean_vec = compute_mean_vector(embeddings)
-
-        # store in qdrant
-        res = upsert_document_vector(doc.id, doc.title, mean_vec)
-        print(res)
-
-        doc.status = "ready"
-        doc.chunk_count = len(chunk_objs)
-        doc.token_count = total_tokens
-        doc.doc_vector = mean_vec
-        doc.similar_ready = True
-        doc.progress = 100
-        doc.last_indexed_at = timezone.now()
-        doc.save(update_fields=["status", "progress","last_indexed_at","chunk_count","token_count","doc_vector","similar_ready"])
-
-        logger.info(f"Completed Chunking document {document_id}")
-        # optional future: send event via webhook / redis pubsub
-        return {"status":'ok', "timezone":timezone.now()}
-    
+        progress.update(40, force=True)
+
+        # Fan out: one task per window of chunks, combined by finalize_document.
+        # Big documents can be sent to a separate queue so small uploads don't wait behind them.
+        options = {}
+        if settings.INGEST_BULK_QUEUE and len(batches) > settings.INGEST_BULK_THRESHOLD_BATCHES:
+            options["queue"] = settings.INGEST_BULK_QUEUE
+        finalize = finalize_document.s(document_id, kept).on_error(mark_document_failed.si(document_id))
+        if batches:
+            header = [embed_chunk_batch.s(document_id, ids, True).set(**options) for ids in batches]
+            logger.info(f"Document {document_id}: dispatching {len(header)} embedding batches")
+            replacement = chord(header, finalize)
+        else:
+            replacement = finalize.clone(args=([],))
+
     except Exception as e:
         logger.error(f"Error while chunking {e}", exc_info=True)
         doc.status = "error"
         doc.metadata['error'] = str(e)
         print(f"{traceback.format_exc()}")
-        doc.save(update_fields=["status"])
-        raise
\ No newline at end of file
+        doc.save(update_fields=["status", "metadata"])
+        raise
+
+    # outside the try: replace() ends this task by raising celery's Ignore
+    return self.replace(replacement)
+
+
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def embed_chunk_batch(document_id, chunk_ids, report_progress=False):
+    """
+    Embeds and upserts one window of chunks.
+    Returns the partial vector sum, count and token total for finalize_document.
+    With `report_progress` the document's progress moves through 40-90 with
+    the share of its chunks that have vectors.
+    """
+    doc = Document.objects.get(id=document_id)
+    chunk_objs = list(Chunk.objects.filter(id__in=chunk_ids).order_by("index"))
+
+    embeddings = embed_and_store_chunks(doc, chunk_objs)
+    centroid = CentroidAccumulator()
+    centroid.add(embeddings)
+
+    if report_progress:
+        # derived from completed work rather than summed per-batch steps, which round
+        # to 0 once a document has more than 100 batches; rounded only when stored
+        chunks = Chunk.objects.filter(document_id=document_id)
+        total = chunks.count()
+        done = chunks.exclude(vector_id="").count()
+        progress = 40 + 50 * done / total if total else 40
+        Document.objects.filter(id=document_id).update(progress=Greatest(F("progress"), int(progress)))
+
+    return {
+        "sum": centroid.total.tolist() if centroid.count else None,
+        "count": centroid.count,
+        "tokens": sum(chunk.token_count for chunk in chunk_objs),
+    }
+
+
+@shared_task
+def finalize_document(batch_results, document_id, kept=None):
+    """
+    Chord callback: combines the partial sums into the document centroid,
+    stores it in Qdrant and marks the document ready.
+    """
+    doc = Document.objects.get(id=document_id)
+
+    total = None
+    count = 0
+    total_tokens = 0
+    for part in list(batch_results) + ([kept] if kept else []):
+        if part["count"]:
+            part_sum = np.asarray(part["sum"], dtype=np.float64)
+            total = part_sum if total is None else total + part_sum
+            count += part["count"]
+        total_tokens += part["tokens"]
+
+    mean_vec = (total / count).tolist() if count else None
+
+    # passages removed by an incremental reindex go only now that their replacements are stored
+    vanished = (kept or {}).get("vanished") or []
+    if vanished:
+        get_vector_store().delete(settings.CHUNKS_COLLECTION_NAME, ids=vanished)
+        Chunk.objects.filter(id__in=vanished).delete()
+
+    # store the centroid in the vector store
+    if mean_vec is not None:
+        try:
+            get_vector_store().upsert(settings.DOCUMENT_COLLECTION_NAME, [
+                (doc.id, mean_vec, {"title": doc.title, "document_id": doc.id, "owner_id": doc.owner_id}),
+            ])
+        except Exception as e:
+            logger.error("Could not store centroid of document %s: %s", doc.id, e)
+
+    doc.status = "ready"
+    doc.chunk_count = Chunk.objects.filter(document_id=document_id).count()
+    doc.token_count = total_tokens
+    doc.doc_vector = mean_vec
+    doc.similar_ready = True
+    doc.progress = 100
+    doc.last_indexed_at = timezone.now()
+    if doc.metadata:
+        doc.metadata.pop("error", None)  # left over from an earlier failed run
+    doc.save(update_fields=["status", "progress","last_indexed_at","chunk_count","token_count","doc_vector","similar_ready","metadata"])
+    bump_index_version(doc.owner_id)
+
+    logger.info(f"Completed Chunking document {document_id}")
+    # optional future: send event via webhook / redis pubsub
+    return {"status":'ok', "timezone":timezone.now()}
+
+
+@shared_task
+def mark_document_failed(document_id):
+    """
+    Error callback for the ingestion chord.
+    """
+    logger.error(f"Ingestion failed for document {document_id}")
+    Document.objects.filter(id=document_id).update(status="error")
@@ -1,3 +1,268 @@
-from django.test import TestCase
+import asyncio
+import os
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django_redis import get_redis_connection
+
+from document_manager.models import Chunk, Document
+from document_manager.tasks import process_document
+from document_manager.utilities.async_search import arun_hybrid_search
+from document_manager.utilities.chunking import chunk_text, iter_chunks
+from document_manager.utilities.embeddings import get_local_embeddings, get_provider_model
+from document_manager.utilities.rate_limiter import EmbeddingRateLimiter
+from document_manager.utilities.runtime_settings import runtime_settings
+from document_manager.vector_store import get_vector_store
+
+
+class AsyncHybridSearchTests(TransactionTestCase):
+    """
+    arun_hybrid_search in a cold process: no vector store built and no runtime
+    settings loaded yet. Anything that reaches the ORM synchronously from the
+    event loop raises SynchronousOnlyOperation and shows up as a failed leg.
+    """
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(
+            VECTOR_STORE_BACKEND="document_manager.vector_store.numpy_store.NumpyVectorStore",
+            VECTOR_STORE_PATH=tmp.name,
+            EMBEDDING_PROVIDER="local",
+            EMBEDDING_RATE_LIMIT_ENABLED=False,
+            HYBRID_SEARCH_MODE="merge",
+            SEARCH_RESULT_CACHE_ENABLED=False,
+            SEARCH_LEG_TIMEOUT=10,
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(get_vector_store.cache_clear)
+
+        self.user = get_user_model().objects.create_user("alice", password="secret")
+        self.doc = Document.objects.create(owner=self.user, title="Quarterly report", file="documents/report.txt",
+                                           status="ready")
+        texts = ["Revenue grew strongly in the third quarter.", "The office moved to a new building in May."]
+        chunks = Chunk.objects.bulk_create([
+            Chunk(document=self.doc, index=i, text=text, vector_id=str(i)) for i, text in enumerate(texts)
+        ])
+        get_vector_store.cache_clear()
+        get_vector_store().upsert(settings.CHUNKS_COLLECTION_NAME, [
+            (chunk.id, vector, {"owner_id": self.user.id, "document_id": self.doc.id, "chunk_id": chunk.id,
+                                "title": self.doc.title})
+            for chunk, vector in zip(chunks, get_local_embeddings(texts))
+        ])
+
+        # what a freshly started worker sees
+        get_vector_store.cache_clear()
+        runtime_settings.invalidate()
+
+    def test_cold_process_search_runs_every_leg(self):
+        search = asyncio.run(arun_hybrid_search("revenue third quarter", self.user.id, threshold=0.1))
+
+        self.assertEqual(search["failed_legs"], [])
+        self.assertFalse(search["degraded"])
+        self.assertEqual(search["results"][0]["document_id"], self.doc.id)
+        sources = {chunk["source"] for result in search["results"] for chunk in result["chunks"]}
+        self.assertIn("semantic", sources)
+
+
+class IncrementalReindexTests(TestCase):
+    """
+    process_document with the chord run eagerly in-process: unchanged chunks keep
+    their rows and vectors, removed ones survive until finalize_document, and a
+    model switch throws every stored vector away.
+    """
+
+    SENTENCES = {
+        "a": "Revenue grew strongly in the third quarter.",
+        "b": "The office moved to a new building in May.",
+        "c": "Hiring slowed down after the summer break.",
+        "d": "A new product line launches next spring.",
+    }
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        overrides = override_settings(
+            MEDIA_ROOT=tmp.name,
+            VECTOR_STORE_BACKEND="document_manager.vector_store.numpy_store.NumpyVectorStore",
+            VECTOR_STORE_PATH=os.path.join(tmp.name, "vectors"),
+            EMBEDDING_PROVIDER="local",
+            EMBEDDING_RATE_LIMIT_ENABLED=False,
+            CHUNKING_MODE="chars",
+            # one sentence per chunk
+            CHUNK_MAX_CHARS=60,
+            CHUNK_OVERLAP_CHARS=0,
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        get_vector_store.cache_clear()
+        self.addCleanup(get_vector_store.cache_clear)
+        runtime_settings.invalidate()
+        self.addCleanup(runtime_settings.invalidate)
+
+        os.makedirs(os.path.join(tmp.name, "documents"))
+        self.path = os.path.join(tmp.name, "documents", "report.txt")
+        user = get_user_model().objects.create_user("alice", password="secret")
+        self.doc = Document.objects.create(owner=user, title="Quarterly report", file="documents/report.txt")
+
+    def write(self, *keys):
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(" ".join(self.SENTENCES[key] for key in keys))
+
+    def chunk(self, incremental):
+        """Runs process_document up to the chord it would be replaced by."""
+        with mock.patch.object(process_document, "replace", side_effect=lambda sig: sig):
+            return process_document.run(self.doc.id, incremental=incremental)
+
+    def chunk_ids(self):
+        return {chunk.text: chunk.id for chunk in Chunk.objects.filter(document=self.doc)}
+
+    def stored_points(self, ids):
+        return set(get_vector_store().retrieve(settings.CHUNKS_COLLECTION_NAME, list(ids)))
+
+    def test_incremental_reindex_keeps_unchanged_chunks_in_new_order(self):
+        self.write("a", "b", "c")
+        self.chunk(incremental=False).apply().get()
+        before = self.chunk_ids()
+
+        self.write("c", "a", "d")
+        replacement = self.chunk(incremental=True)
+
+        # the removed passage is still searchable while its replacement is embedded
+        removed = before[self.SENTENCES["b"]]
+        self.assertEqual(self.stored_points([removed]), {removed})
+        self.assertLess(Chunk.objects.get(id=removed).index, 0)
+
+        replacement.apply().get()
+        after = {chunk.text: chunk for chunk in Chunk.objects.filter(document=self.doc)}
+        self.assertEqual(
+            [(chunk.text, chunk.index) for chunk in sorted(after.values(), key=lambda c: c.index)],
+            [(self.SENTENCES["c"], 0), (self.SENTENCES["a"], 1), (self.SENTENCES["d"], 2)],
+        )
+        for key in ("a", "c"):
+            self.assertEqual(after[self.SENTENCES[key]].id, before[self.SENTENCES[key]])
+        self.assertNotIn(after[self.SENTENCES["d"]].id, before.values())
+        self.assertEqual(self.stored_points(before.values()),
+                         {before[self.SENTENCES["a"]], before[self.SENTENCES["c"]]})
+        self.assertIn(after[self.SENTENCES["d"]].id, self.stored_points([after[self.SENTENCES["d"]].id]))
+
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.status, "ready")
+        self.assertEqual(self.doc.chunk_count, 3)
+
+    def test_model_switch_reembeds_every_chunk(self):
+        self.write("a", "b", "c")
+        self.chunk(incremental=False).apply().get()
+        before = self.chunk_ids()
+        # indexed by another provider: same text, but vectors from another embedding space
+        Document.objects.filter(id=self.doc.id).update(embedding_model="text-embedding-3-small")
+
+        self.chunk(incremental=True).apply().get()
+        after = self.chunk_ids()
+
+        self.assertEqual(set(after), set(before))
+        self.assertFalse(set(after.values()) & set(before.values()))
+        self.assertEqual(self.stored_points(before.values()), set())
+        self.assertEqual(self.stored_points(after.values()), set(after.values()))
+        self.doc.refresh_from_db()
+        self.assertEqual(self.doc.embedding_model, get_provider_model("local"))
+
+
+class IterChunksTests(SimpleTestCase):
+    """
+    Streaming chunking: offsets index into the concatenated pieces and
+    neighbouring chunks overlap, also across window boundaries.
+    """
+
+    WORDS = "alpha beta gamma delta epsilon zeta eta theta iota kappa".split()
+
+    def setUp(self):
+        sentences = []
+        for i in range(150):
+            words = [self.WORDS[(i * 7 + j * 3) % len(self.WORDS)] for j in range(3 + i % 9)]
+            sentences.append(" ".join(words).capitalize() + ".")
+        self.text = " ".join(sentences)
+        # piece boundaries that ignore words and sentences
+        self.pieces = [self.text[i:i + 37] for i in range(0, len(self.text), 37)]
+
+    def test_offsets_point_at_the_chunk_text(self):
+        for overlap, window in [(30, None), (30, 400), (0, 500)]:
+            with self.subTest(overlap=overlap, window=window):
+                chunks = list(iter_chunks(self.pieces, max_chars=120, overlap=overlap, window=window))
+
+                self.assertEqual([c["index"] for c in chunks], list(range(len(chunks))))
+                for c in chunks:
+                    self.assertEqual(self.text[c["start"]:c["end"]], c["text"])
+                self.assertEqual(chunks[0]["start"], 0)
+                self.assertEqual(chunks[-1]["end"], len(self.text))
+
+    def test_neighbouring_chunks_overlap(self):
+        chunks = list(iter_chunks(self.pieces, max_chars=120, overlap=30, window=400))
+        for prev, chunk in zip(chunks, chunks[1:]):
+            self.assertLess(chunk["start"], prev["end"])
+            self.assertGreater(chunk["end"], prev["end"])
+
+    def test_without_overlap_chunks_only_skip_whitespace(self):
+        chunks = list(iter_chunks(self.pieces, max_chars=120, overlap=0, window=500))
+        for prev, chunk in zip(chunks, chunks[1:]):
+            self.assertEqual(self.text[prev["end"]:chunk["start"]].strip(), "")
+            self.assertGreater(chunk["start"], prev["end"] - 1)
+
+    def test_single_window_matches_chunk_text(self):
+        text = self.text[:900]
+        streamed = list(iter_chunks([text[:100], text[100:]], max_chars=120, overlap=30))
+        self.assertEqual(streamed, chunk_text(text, max_chars=120, overlap=30))
+
+
+@override_settings(
+    EMBEDDING_RATE_LIMIT_ENABLED=True,
+    EMBEDDING_RATE_LIMITS={"test-limiter": {"rpm": 10, "tpm": 1000}},
+    EMBEDDING_INTERACTIVE_RESERVE=0.2,
+)
+class EmbeddingRateLimiterTests(SimpleTestCase):
+    """
+    The Lua token buckets against a real redis; skipped when none is reachable.
+    Refill is one request per six seconds, so nothing refills during a test.
+    """
+
+    KEYS = ["ratelimit:test-limiter:requests", "ratelimit:test-limiter:tokens"]
+
+    def setUp(self):
+        try:
+            self.redis = get_redis_connection("default")
+            self.redis.ping()
+        except Exception as e:
+            self.skipTest(f"redis unavailable: {e}")
+        self.redis.delete(*self.KEYS)
+        self.addCleanup(self.redis.delete, *self.KEYS)
+        self.limiter = EmbeddingRateLimiter()
+
+    def test_bulk_requests_leave_the_interactive_reserve(self):
+        # 20% of the 10 request bucket is reserved for interactive queries
+        for _ in range(8):
+            self.assertEqual(self.limiter._try_acquire("test-limiter", 10, interactive=False), 0)
+        self.assertGreater(self.limiter._try_acquire("test-limiter", 10, interactive=False), 0)
+
+        for _ in range(2):
+            self.assertEqual(self.limiter._try_acquire("test-limiter", 10, interactive=True), 0)
+        self.assertGreater(self.limiter._try_acquire("test-limiter", 10, interactive=True), 0)
+
+    def test_oversized_bulk_request_drains_only_the_usable_bucket(self):
+        # 5000 tokens would never fit a 1000 TPM bucket; it takes the 800 bulk callers may use
+        self.assertEqual(self.limiter._try_acquire("test-limiter", 5000, interactive=False), 0)
+        self.assertEqual(float(self.redis.hget(self.KEYS[1], "level")), 200)
+
+        self.assertGreater(self.limiter._try_acquire("test-limiter", 10, interactive=False), 0)
+        self.assertEqual(self.limiter._try_acquire("test-limiter", 10, interactive=True), 0)
+
+    def test_disabled_limiter_never_waits(self):
+        with override_settings(EMBEDDING_RATE_LIMIT_ENABLED=False):
+            for _ in range(20):
+                self.assertEqual(self.limiter._try_acquire("test-limiter", 10, interactive=False), 0)
+        self.assertFalse(self.redis.exists(*self.KEYS))
@@ -1,6 +1,17 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+# search panels: async views under ASGI (uvicorn), sync views under WSGI (gunicorn sync workers)
+if settings.ASYNC_SEARCH_VIEWS:
+    search_result_panel = views.adocument_search_result_panel
+    similar_docs_panel = views.asimilar_docs_panel
+    explain_result_panel = views.aexplain_result_panel
+else:
+    search_result_panel = views.document_search_result_panel
+    similar_docs_panel = views.similar_docs_panel
+    explain_result_panel = views.explain_result_panel
+
 app_name = "document_manager"
 
 urlpatterns = [
@@ -8,12 +19,12 @@ urlpatterns = [
     path("panel/list/", views.document_list_panel, name="document_list_panel"),
     path("panel/upload/", views.document_upload_panel, name="document_upload_panel"),
     path("panel/search/input", views.document_search_input_panel, name="document_search_input_panel"),
-    path("panel/search/result", views.document_search_result_panel, name="document_search_result_panel"),
+    path("panel/search/result", search_result_panel, name="document_search_result_panel"),
     path("panel/progress/<int:document_id>", views.document_progress_panel, name="document_progress_panel"),
     path("panel/analytics/summary", views.analytics_summary_panel, name="analytics_summary_panel"),
     path("panel/analytics/table", views.analytics_table_panel, name="analytics_table_panel"),
-    path("panel/similar_document/<int:doc_id>", views.similar_docs_panel, name="similar_docs_panel"),
-    path("panel/explain_document/<int:doc_id>", views.explain_result_panel, name="explain_result_panel"),
+    path("panel/similar_document/<int:doc_id>", similar_docs_panel, name="similar_docs_panel"),
+    path("panel/explain_document/<int:doc_id>", explain_result_panel, name="explain_result_panel"),
     path("panel/document_similarity_explain/<int:doc_a_id>/<int:doc_b_id>/", views.explain_doc_similarity, name="explain_doc_similarity"),
     
     # main pages/APIs
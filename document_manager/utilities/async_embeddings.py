@@ -0,0 +1,280 @@
+import asyncio
+import concurrent.futures
+import logging
+import os
+import random
+import threading
+import weakref
+from email.utils import parsedate_to_datetime
+from typing import List
+
+import httpx
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from document_manager.utilities.embedding_cache import embedding_cache, query_embedding_cache
+from document_manager.utilities.embeddings import _batch_texts, _normalize_text_input, get_local_embeddings, get_provider_model
+from document_manager.utilities.rate_limiter import rate_limiter
+from document_manager.utilities.runtime_settings import runtime_settings
+from document_manager.utilities.tokenizer import count_tokens
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class EmbeddingRequestError(RuntimeError):
+    """Raised when a provider request still fails after all retries."""
+
+
+def _retry_after_seconds(response: httpx.Response):
+    """
+    Reads the provider's requested wait from `retry-after-ms` or `Retry-After`
+    (seconds or an HTTP date). Returns None when there is no usable header.
+    """
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return max((parsedate_to_datetime(value) - timezone.now()).total_seconds(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _backoff_seconds(attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    cap = min(settings.EMBEDDING_RETRY_MAX_DELAY, settings.EMBEDDING_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+class AsyncEmbeddingClient:
+    """
+    Async embedding client for OpenAI and Ollama.
+    Keeps one pooled httpx.AsyncClient per event loop, caps in-flight requests
+    at EMBEDDING_MAX_CONCURRENCY, and retries 429/5xx and transport errors,
+    honouring Retry-After and otherwise backing off with jitter.
+    """
+
+    def __init__(self):
+        self._clients = weakref.WeakKeyDictionary()
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _http(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                timeout=settings.EMBEDDING_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.EMBEDDING_MAX_CONCURRENCY,
+                    max_keepalive_connections=settings.EMBEDDING_MAX_CONCURRENCY,
+                ),
+            )
+            self._clients[loop] = client
+        return client
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._semaphores.get(loop)
+        if sem is None:
+            sem = asyncio.Semaphore(settings.EMBEDDING_MAX_CONCURRENCY)
+            self._semaphores[loop] = sem
+        return sem
+
+    async def _post(self, url: str, json: dict, headers: dict = None) -> dict:
+        last_error = None
+        for attempt in range(settings.EMBEDDING_MAX_RETRIES + 1):
+            wait = None
+            async with self._semaphore():
+                try:
+                    resp = await self._http().post(url, json=json, headers=headers)
+                except (httpx.TransportError, httpx.TimeoutException) as e:
+                    last_error = e
+                else:
+                    if resp.status_code < 400:
+                        return resp.json()
+                    if resp.status_code not in RETRY_STATUSES:
+                        raise EmbeddingRequestError(f"{url} returned {resp.status_code}: {resp.text[:200]}")
+                    last_error = EmbeddingRequestError(f"{url} returned {resp.status_code}")
+                    wait = _retry_after_seconds(resp)
+
+            if attempt == settings.EMBEDDING_MAX_RETRIES:
+                break
+            # sleep outside the semaphore so other requests can use the slot
+            delay = wait if wait is not None else _backoff_seconds(attempt)
+            logger.warning("Embedding request failed (%s), retry %d in %.2fs", last_error, attempt + 1, delay)
+            await asyncio.sleep(delay)
+
+        raise EmbeddingRequestError(f"Embedding request failed after {settings.EMBEDDING_MAX_RETRIES} retries: {last_error}")
+
+    async def embed_openai(self, texts: list[str]) -> List[List[float]]:
+        data = await self._post(
+            f"{settings.OPENAI_BASE_URL}/embeddings",
+            json={"model": settings.OPENAI_EMBEDDING_MODEL, "input": [_normalize_text_input(t) for t in texts]},
+            headers={"Authorization": f"Bearer {os.getenv('OPENAI_KEY')}"},
+        )
+        return [d["embedding"] for d in sorted(data["data"], key=lambda d: d["index"])]
+
+    async def embed_ollama(self, texts: list[str]) -> List[List[float]]:
+        url = f"{os.getenv('OLLAMA_URL', 'http://localhost:11434')}/embeddings"
+        model = settings.OLLAMA_EMBEDDING_MODEL
+        data = await self._post(url, json={"model": model, "input": texts})
+        if "embeddings" in data and len(data["embeddings"]) == len(texts):
+            return data["embeddings"]
+        # server without batch support: one request per text, still concurrent
+        results = await asyncio.gather(*(self._post(url, json={"model": model, "input": t}) for t in texts))
+        return [r["embedding"] for r in results]
+
+    async def embed_batch(self, provider: str, texts: list[str], tokens: int = None,
+                          interactive: bool = False) -> List[List[float]]:
+        """
+        Embeds one batch after reserving it in the shared rate limiter.
+        """
+        if tokens is None:
+            tokens = sum(count_tokens(t, provider) for t in texts)
+        await rate_limiter.aacquire(provider, tokens, interactive=interactive)
+        if provider == "openai":
+            vectors = await self.embed_openai(texts)
+        elif provider == "ollama":
+            vectors = await self.embed_ollama(texts)
+        elif provider == "local":
+            # CPU-bound; keep it off the event loop
+            vectors = await asyncio.to_thread(get_local_embeddings, texts)
+        else:
+            raise RuntimeError(f"Unknown embedding provider: {provider}")
+        if len(vectors) != len(texts):
+            raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {len(texts)} inputs")
+        return vectors
+
+    async def embed_batches(self, provider: str, batches: list[tuple[list[str], int]],
+                            on_batch=None) -> List[List[List[float]]]:
+        """
+        Embeds (texts, token total) batches concurrently as bulk traffic;
+        results are in batch order.
+        `on_batch(batch_no, vectors)` is called as each batch completes.
+        """
+        async def run(batch_no, texts, tokens):
+            vectors = await self.embed_batch(provider, texts, tokens=tokens)
+            if on_batch:
+                on_batch(batch_no, vectors)
+            return vectors
+
+        return await asyncio.gather(*(run(n, texts, tokens) for n, (texts, tokens) in enumerate(batches)))
+
+
+async_embedding_client = AsyncEmbeddingClient()
+
+
+class _BackgroundLoop:
+    """
+    One event loop thread per process, so sync callers (Celery tasks, sync
+    views) share the pooled async client across calls. Re-created after fork.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+
+    def get(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                self._pid = os.getpid()
+                threading.Thread(target=self._loop.run_forever, name="embedding-loop", daemon=True).start()
+            return self._loop
+
+
+_background_loop = _BackgroundLoop()
+
+
+def run_async(coro, timeout: float = None):
+    """
+    Runs `coro` on the shared background loop and blocks for the result.
+    With `timeout` the coroutine is cancelled once it expires, together with
+    any retry or rate-limit wait it was in, and TimeoutError is raised.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _background_loop.get())
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise
+
+
+async def aget_embedding(text: str) -> List[float]:
+    """
+    Async counterpart of `get_embedding`, for the search path.
+    """
+    provider = await runtime_settings.aget("embedding_provider")
+    return (await async_embedding_client.embed_batch(provider, [text], interactive=True))[0]
+
+
+async def aget_query_embedding(query: str) -> List[float]:
+    """
+    Async counterpart of `get_query_embedding`.
+    """
+    provider = await runtime_settings.aget("embedding_provider")
+    normalized = query_embedding_cache.normalize(query)
+    key = query_embedding_cache.make_key(normalized, provider, get_provider_model(provider), settings.VECTOR_SIZE)
+    cached = await sync_to_async(query_embedding_cache.get_many)([key])
+    if key in cached:
+        return cached[key]
+
+    embedding = (await async_embedding_client.embed_batch(provider, [normalized], interactive=True))[0]
+    await sync_to_async(query_embedding_cache.set_many)({key: embedding})
+    return embedding
+
+
+async def aget_embeddings(texts: list[str], token_counts: list[int] = None) -> List[List[float]]:
+    """
+    Async counterpart of `get_embeddings`: cache lookups first, then the
+    remaining distinct texts are batched and embedded concurrently.
+    """
+    if not texts:
+        return []
+
+    provider = await runtime_settings.aget("embedding_provider")
+    model = get_provider_model(provider)
+    keys = [embedding_cache.make_key(t, provider, model, settings.VECTOR_SIZE) for t in texts]
+    cached = await sync_to_async(embedding_cache.get_many)(list(set(keys)))
+
+    pending = {}
+    for i, (text, key) in enumerate(zip(texts, keys)):
+        if key not in cached and key not in pending:
+            pending[key] = i
+    pending_keys = list(pending)
+    pending_texts = [texts[i] for i in pending.values()]
+
+    batches = _batch_texts(
+        pending_texts,
+        max_items=settings.EMBEDDING_BATCH_SIZE,
+        max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+        token_counts=[token_counts[i] for i in pending.values()] if token_counts else None,
+        provider=provider,
+    )
+    results = await async_embedding_client.embed_batches(
+        provider, [([pending_texts[i] for i in batch], tokens) for batch, tokens in batches],
+    )
+    fresh = {}
+    for (batch, _), vectors in zip(batches, results):
+        fresh.update({pending_keys[i]: vec for i, vec in zip(batch, vectors)})
+    await sync_to_async(embedding_cache.set_many)(fresh)
+    cached.update(fresh)
+
+    logger.info(
+        "Embedded %d texts (%d from cache) in %d concurrent batches; cache stats %s",
+        len(texts), len(texts) - len(pending_texts), len(batches), embedding_cache.get_stats(),
+    )
+    return [cached[key] for key in keys]
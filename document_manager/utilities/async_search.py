@@ -0,0 +1,160 @@
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from document_manager.models import Document
+from document_manager.utilities.async_embeddings import aget_query_embedding
+from document_manager.utilities.search import (
+    build_explanation,
+    flatten_hybrid_hits,
+    group_hits,
+    hydrate_from_payload,
+    hydration_queryset,
+    hybrid_or_keyword,
+    keyword_search,
+    merge_leg_hits,
+    owner_filter,
+    related_documents,
+    semantic_filters,
+    semantic_results,
+)
+from document_manager.utilities.search_cache import get_cached_results, set_cached_results
+from document_manager.utilities.sparse import sparse_query_vector
+from document_manager.vector_store import get_vector_store
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of utilities/search.py for the ASGI views: the embedding
+# provider and the vector store are awaited instead of pinning a worker thread.
+# Result shapes are identical; the I/O-free helpers that build them
+# (filters, hydration, merging, grouping) are shared from search.py.
+
+akeyword_search = sync_to_async(keyword_search)
+
+
+async def arun_legs(legs: dict, timeout: float) -> tuple[dict, list]:
+    """
+    Async counterpart of `run_legs`: runs {name: coroutine} concurrently and
+    waits at most `timeout` seconds. Late legs are cancelled.
+    """
+    tasks = {name: asyncio.ensure_future(coro) for name, coro in legs.items()}
+    await asyncio.wait(tasks.values(), timeout=timeout)
+
+    results = {}
+    failed = []
+    for name, task in tasks.items():
+        if not task.done():
+            task.cancel()
+            logger.warning("Search leg %s missed the %.2fs deadline", name, timeout)
+            failed.append(name)
+        elif task.exception() is not None:
+            logger.error("Search leg %s failed: %s", name, task.exception())
+            failed.append(name)
+        else:
+            results[name] = task.result()
+    return results, failed
+
+
+async def ahydrate_hits(hits: list) -> dict:
+    data, missing = hydrate_from_payload(hits)
+    if missing:
+        async for chunk in hydration_queryset(missing):
+            data[chunk.id] = {"document_title": chunk.document.title, "text": chunk.text}
+    return data
+
+
+async def asemantic_search(query: str, user_id: int, top_k: int = 10, max_chunks_per_doc=3,
+                           similarity_threshold=0.30, two_stage: bool = None):
+    if two_stage is None:
+        two_stage = settings.SEARCH_TWO_STAGE
+
+    query = query.strip()
+    if not query:
+        return []
+
+    embedding = await aget_query_embedding(query)
+    store = get_vector_store()
+    candidates = None
+    if two_stage:
+        candidates = await store.asearch(
+            store.documents_collection,
+            embedding,
+            top_k=settings.SEARCH_TWO_STAGE_CANDIDATES,
+            filters=owner_filter(user_id),
+        )
+
+    groups = await store.asearch(
+        store.chunks_collection,
+        embedding,
+        top_k=top_k,
+        filters=semantic_filters(user_id, candidates),
+        group_by="document_id",
+        group_size=max_chunks_per_doc,
+        score_threshold=similarity_threshold,
+    )
+    chunk_data = await ahydrate_hits([hit for group in groups for hit in group["hits"]])
+    return semantic_results(groups, chunk_data)
+
+
+async def anative_hybrid_hits(query: str, user_id: int, threshold: float, top_k: int = 20):
+    query = query.strip()
+    if not query:
+        return []
+
+    hits = await get_vector_store().ahybrid_search(
+        await aget_query_embedding(query),
+        sparse_query_vector(query),
+        top_k=top_k,
+        filters=owner_filter(user_id),
+        score_threshold=threshold,
+    )
+    return flatten_hybrid_hits(hits, await ahydrate_hits(hits))
+
+
+async def arun_hybrid_search(query, user_id, threshold=0.75):
+    """
+    Async counterpart of `run_hybrid_search`.
+    """
+    cached = await sync_to_async(get_cached_results)(user_id, query, threshold)
+    if cached is not None:
+        return {"results": cached, "degraded": False, "failed_legs": []}
+
+    if settings.HYBRID_SEARCH_MODE == "native" and await get_vector_store().asupports_sparse():
+        # keyword fallback: see native_or_keyword_hits
+        legs = {"hybrid": anative_hybrid_hits(query, user_id, threshold)}
+        if settings.SEARCH_KEYWORD_FALLBACK == "concurrent":
+            legs["keyword"] = akeyword_search(query, user_id)
+        legs, failed = await arun_legs(legs, timeout=settings.SEARCH_LEG_TIMEOUT)
+        if "hybrid" not in legs and "keyword" not in legs and "keyword" not in failed:
+            fallback, fallback_failed = await arun_legs({"keyword": akeyword_search(query, user_id)},
+                                                        timeout=settings.SEARCH_LEG_TIMEOUT)
+            legs.update(fallback)
+            failed += fallback_failed
+        merged, failed = hybrid_or_keyword(legs, failed)
+    else:
+        legs, failed = await arun_legs({
+            "semantic": asemantic_search(query, user_id, similarity_threshold=threshold),
+            "keyword": akeyword_search(query, user_id),
+        }, timeout=settings.SEARCH_LEG_TIMEOUT)
+        merged = merge_leg_hits(legs.get("semantic", []), legs.get("keyword", []))
+
+    final = group_hits(merged, query, threshold)
+    if not failed:
+        await sync_to_async(set_cached_results)(user_id, query, threshold, final)
+    return {"results": final, "degraded": bool(failed), "failed_legs": failed}
+
+
+async def aexplain_single_document(document_id, query, threshold, user_id):
+    search = await arun_hybrid_search(query=query, user_id=user_id, threshold=threshold)
+    return build_explanation(search["results"], document_id, threshold)
+
+
+async def asimilar_documents(doc_id, limit=5):
+    doc = await Document.objects.filter(id=doc_id).only("id", "doc_vector").afirst()
+    if not doc.doc_vector:
+        return []
+
+    res = await get_vector_store().asimilar_documents(doc.doc_vector, limit + 1)  # include itself
+    return related_documents(res, doc_id, limit)
@@ -1,6 +1,10 @@
 import re
+import hashlib
+from document_manager.utilities.tokenizer import get_encoding
 
 SENTENCE_SPLIT_RE = re.compile(r'(?<=[\.\?\!])\s+')
+# rough size of a token in English text; only used to size streaming windows
+CHARS_PER_TOKEN = 4
 
 def _split_into_sentences(text: str) -> list[str]:
     """
@@ -15,6 +19,36 @@ def _split_into_sentences(text: str) -> list[str]:
     # Remove empty sentences and strip whitespace
     return [s.strip() for s in sentences if s.strip()]
 
+def chunk_hash(text: str) -> str:
+    """
+    Content hash used to match chunks across reindexes.
+    Whitespace runs are collapsed so re-extraction noise doesn't force a re-embed.
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+def _sentence_offsets(text: str, sentences: list[str]) -> list[int]:
+    offsets = []
+    pos = 0
+    for s in sentences:
+        # find the next occurrence of the sentence from pos
+        # use find to avoid accidental mismatches
+        found = text.find(s, pos)
+        if found == -1:
+            # fallback: use pos (should rarely happen)
+            found = pos
+        offsets.append(found)
+        pos = found + len(s)
+    return offsets
+
+def _sanitize_overlap(max_chars: int, overlap: int) -> int:
+    if overlap < 0:
+        overlap = 0
+    if overlap >= max_chars // 2:
+        # keep some overlap but not too big
+        overlap = max(0, max_chars // 4)
+    return overlap
+
 def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> list[dict]:
     """
     Break `text` into chunks approximating `max_chars` characters each.
@@ -44,12 +78,7 @@ def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> list[dic
     if not text:
         return []
 
-    # sanitize overlap
-    if overlap < 0:
-        overlap = 0
-    if overlap >= max_chars // 2:
-        # keep some overlap but not too big
-        overlap = max(0, max_chars // 4)
+    overlap = _sanitize_overlap(max_chars, overlap)
 
     sentences = _split_into_sentences(text)
 
@@ -65,17 +94,7 @@ def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> list[dic
         chunks.append({"index": idx, "text": chunk_text_str, "start": start_idx, "end": end_idx})
 
     # Precompute sentence start offsets to map back to character positions
-    offsets = []
-    pos = 0
-    for s in sentences:
-        # find the next occurrence of the sentence from pos
-        # use find to avoid accidental mismatches
-        found = text.find(s, pos)
-        if found == -1:
-            # fallback: use pos (should rarely happen)
-            found = pos
-        offsets.append(found)
-        pos = found + len(s)
+    offsets = _sentence_offsets(text, sentences)
 
     for i, (sent, sent_start) in enumerate(zip(sentences, offsets)):
         sent_len = len(sent)
@@ -117,7 +136,8 @@ def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> list[dic
                 if tail.strip():
                     current_chunk.append(tail.strip())
                     current_len = len(tail)
-                    current_start = overlap_start_pos
+                    # the stripped tail starts after any whitespace it was cut at
+                    current_start = overlap_start_pos + len(tail) - len(tail.lstrip())
                 else:
                     current_len = 0
                     current_start = None
@@ -149,4 +169,155 @@ def chunk_text(text: str, max_chars: int = 1200, overlap: int = 200) -> list[dic
     if not chunks and text:
         chunks.append({"index": 0, "text": text, "start": 0, "end": len(text)})
 
-    return chunks
\ No newline at end of file
+    return chunks
+
+
+def chunk_text_by_tokens(text: str, max_tokens: int = 300, overlap_tokens: int = 50) -> list[dict]:
+    """
+    Token-budgeted variant of `chunk_text`.
+    Each sentence is tokenized exactly once; sentences are packed until
+    `max_tokens` is reached and the trailing sentences that fit in
+    `overlap_tokens` are repeated at the start of the next chunk. Sentences
+    longer than the budget are split on token boundaries.
+    Returns the same dicts as `chunk_text` plus "token_count", so ingestion
+    doesn't have to tokenize the chunks again.
+    """
+    if text is None:
+        return []
+
+    text = text.strip()
+    if not text:
+        return []
+
+    overlap_tokens = _sanitize_overlap(max_tokens, overlap_tokens)
+    sentences = _split_into_sentences(text)
+    offsets = _sentence_offsets(text, sentences)
+    encoding = get_encoding()
+    sentence_tokens = encoding.encode_ordinary_batch(sentences)
+
+    chunks = []
+
+    def push_chunk(start: int, end: int, token_count: int):
+        chunks.append({
+            "index": len(chunks),
+            "text": text[start:end],
+            "start": start,
+            "end": end,
+            "token_count": token_count,
+        })
+
+    def flush(sentence_ids: list[int]):
+        first, last = sentence_ids[0], sentence_ids[-1]
+        push_chunk(offsets[first], offsets[last] + len(sentences[last]),
+                   sum(len(sentence_tokens[j]) for j in sentence_ids))
+
+    current = []
+    current_tokens = 0
+    for i, tokens in enumerate(sentence_tokens):
+        n = len(tokens)
+
+        if n > max_tokens:
+            # oversized sentence: close the current chunk, then cut on token boundaries
+            if current:
+                flush(current)
+            pos = offsets[i]
+            step = max_tokens - overlap_tokens
+            t = 0
+            while t < n:
+                piece = encoding.decode(tokens[t:t + max_tokens])
+                push_chunk(pos, pos + len(piece), min(max_tokens, n - t))
+                if t + max_tokens >= n:
+                    break
+                pos += len(encoding.decode(tokens[t:t + step]))
+                t += step
+            current = []
+            current_tokens = 0
+            continue
+
+        if current and current_tokens + n > max_tokens:
+            flush(current)
+            # carry trailing sentences into the next chunk as overlap
+            carry = []
+            carry_tokens = 0
+            for j in reversed(current):
+                if carry_tokens + len(sentence_tokens[j]) > overlap_tokens:
+                    break
+                carry.insert(0, j)
+                carry_tokens += len(sentence_tokens[j])
+            if carry_tokens + n > max_tokens:
+                carry, carry_tokens = [], 0
+            current, current_tokens = carry, carry_tokens
+
+        current.append(i)
+        current_tokens += n
+
+    if current:
+        flush(current)
+
+    return chunks
+
+
+def _find_window_cut(buffer: str, max_chars: int, min_cut: int) -> int:
+    """
+    Picks where to close a streaming window: the last sentence boundary that
+    still leaves at least `max_chars` of look-ahead, or a hard cut if there is none.
+    """
+    limit = len(buffer) - max_chars
+    cut = None
+    for match in SENTENCE_SPLIT_RE.finditer(buffer, 0, limit):
+        cut = match.end()
+    if cut is None or cut <= min_cut:
+        cut = limit
+    return cut
+
+def iter_chunks(pieces, max_chars: int = 1200, overlap: int = 200, window: int = None,
+                max_tokens: int = None, overlap_tokens: int = 50):
+    """
+    Streaming counterpart of `chunk_text`.
+    Consumes an iterable of text pieces (pages, paragraphs, file blocks) and
+    yields the same chunk dicts, with "start"/"end" offsets into the
+    concatenation of all pieces. Only about `window` characters are buffered:
+    each full window is closed at a sentence boundary, chunked with
+    `chunk_text`, and the last `overlap` characters are carried into the next one.
+    If `max_tokens` is given, windows are chunked with `chunk_text_by_tokens`
+    instead and the character sizes are derived from the token budget.
+    """
+    if max_tokens:
+        max_chars = max_tokens * CHARS_PER_TOKEN
+        overlap = overlap_tokens * CHARS_PER_TOKEN
+
+        def chunker(text):
+            return chunk_text_by_tokens(text, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+    else:
+        def chunker(text):
+            return chunk_text(text, max_chars=max_chars, overlap=overlap)
+
+    overlap = _sanitize_overlap(max_chars, overlap)
+    window = window or max_chars * 8
+
+    buffer = ""
+    base = 0  # offset of buffer[0] in the full text
+    index = 0
+
+    def emit(text: str, offset: int):
+        nonlocal index
+        lead = len(text) - len(text.lstrip())
+        for c in chunker(text):
+            yield {
+                **c,
+                "index": index,
+                "start": offset + lead + c["start"],
+                "end": offset + lead + c["end"],
+            }
+            index += 1
+
+    for piece in pieces:
+        buffer += piece
+        while len(buffer) >= window:
+            cut = _find_window_cut(buffer, max_chars, min_cut=overlap)
+            yield from emit(buffer[:cut], base)
+            keep_from = cut - overlap
+            base += keep_from
+            buffer = buffer[keep_from:]
+
+    yield from emit(buffer, base)
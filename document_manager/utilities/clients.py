@@ -0,0 +1,53 @@
+import functools
+import os
+import threading
+
+
+class ProcessLocal:
+    """
+    Lazily builds one object per process and reuses it for every call.
+    The cached object is dropped in forked children (gunicorn workers, Celery
+    prefork), so sockets and channels opened in the parent are never shared.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # a lock held by another parent thread at fork time would never be released
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+
+    def get(self):
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                self._value = self.factory()
+                self._pid = os.getpid()
+            return self._value
+
+    def reset(self):
+        with self._lock:
+            self._value = None
+            self._pid = None
+
+
+def per_process(factory):
+    """
+    Decorator for client factories: `factory()` runs once per process.
+    The wrapper exposes `reset()` to force a rebuild (e.g. after a settings change).
+    """
+    holder = ProcessLocal(factory)
+
+    @functools.wraps(factory)
+    def get():
+        return holder.get()
+
+    get.reset = holder.reset
+    return get
@@ -0,0 +1,165 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache:
+    """
+    Small thread-safe in-process LRU used in front of Redis.
+    Entries optionally expire after `ttl` seconds.
+    """
+
+    def __init__(self, max_size: int, ttl: int = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            value, expires_at = self._data[key]
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.max_size <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class EmbeddingCache:
+    """
+    Content-addressed embedding cache.
+    Keys are sha256(provider, model, dimensions, normalized text), so identical
+    chunks share one entry across documents, reindexes and workers.
+    Lookups go to the in-process LRU first, then Redis (through Django's cache
+    framework). Redis errors are logged and treated as misses.
+    """
+
+    def __init__(self, cache_alias: str, namespace: str, local_size: int, ttl: int, local_ttl: int = None):
+        self.cache_alias = cache_alias
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LRUCache(local_size, ttl=local_ttl)
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0}
+        self._stats_lock = threading.Lock()
+
+    def normalize(self, text: str) -> str:
+        return text.replace("\x00", " ").strip()
+
+    def make_key(self, text: str, provider: str, model: str, dimensions: int) -> str:
+        raw = f"{provider}\x1f{model}\x1f{dimensions}\x1f{self.normalize(text)}"
+        digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+        return f"{self.namespace}:{digest}"
+
+    def _count(self, name: str, n: int = 1):
+        if not n:
+            return
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def get_many(self, keys: list[str]) -> dict:
+        """
+        Returns {key: vector} for every key found in either tier.
+        """
+        found = {}
+        missing = []
+        for key in keys:
+            vec = self.local.get(key)
+            if vec is None:
+                missing.append(key)
+            else:
+                found[key] = vec
+        self._count("local_hits", len(found))
+
+        if missing:
+            try:
+                remote = caches[self.cache_alias].get_many(missing)
+            except Exception as e:
+                logger.warning("Embedding cache read failed: %s", e)
+                remote = {}
+            for key, raw in remote.items():
+                vec = np.frombuffer(raw, dtype=np.float32).tolist()
+                self.local.set(key, vec)
+                found[key] = vec
+            self._count("redis_hits", len(remote))
+            self._count("misses", len(missing) - len(remote))
+
+        return found
+
+    def set_many(self, items: dict):
+        """
+        Stores {key: vector} in both tiers. Vectors are kept as float32 bytes in Redis.
+        """
+        if not items:
+            return
+        for key, vec in items.items():
+            self.local.set(key, vec)
+        try:
+            caches[self.cache_alias].set_many(
+                {key: np.asarray(vec, dtype=np.float32).tobytes() for key, vec in items.items()},
+                timeout=self.ttl,
+            )
+        except Exception as e:
+            logger.warning("Embedding cache write failed: %s", e)
+
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+        stats["hit_rate"] = round((lookups - stats["misses"]) / lookups, 3) if lookups else 0.0
+        stats["local_size"] = len(self.local)
+        return stats
+
+
+embedding_cache = EmbeddingCache(
+    cache_alias=settings.EMBEDDING_CACHE_ALIAS,
+    namespace="emb",
+    local_size=settings.EMBEDDING_CACHE_LOCAL_SIZE,
+    ttl=settings.EMBEDDING_CACHE_TTL,
+)
+
+
+class QueryEmbeddingCache(EmbeddingCache):
+    """
+    Cache for search-query embeddings. Queries are case- and
+    whitespace-normalized, so "Tax  Policy" and "tax policy" share an entry;
+    callers embed the normalized form to keep entries consistent.
+    """
+
+    def normalize(self, text: str) -> str:
+        return " ".join(text.replace("\x00", " ").split()).casefold()
+
+
+query_embedding_cache = QueryEmbeddingCache(
+    cache_alias=settings.EMBEDDING_CACHE_ALIAS,
+    namespace="qemb",
+    local_size=settings.QUERY_EMBEDDING_CACHE_LOCAL_SIZE,
+    ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+    local_ttl=settings.QUERY_EMBEDDING_CACHE_TTL,
+)
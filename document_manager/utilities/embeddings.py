@@ -1,7 +1,16 @@
 import os
 import logging
+import threading
+import time
+import zlib
+from contextlib import contextmanager
 from typing import List
+import numpy as np
 from document_manager.models import SiteSetting
+from document_manager.utilities.tokenizer import count_tokens
+from document_manager.utilities.embedding_cache import embedding_cache, query_embedding_cache
+from document_manager.utilities.rate_limiter import rate_limiter
+from document_manager.utilities.clients import per_process
 from django.conf import settings
 from openai import OpenAI
 
@@ -9,6 +18,21 @@ logger = logging.getLogger(__name__)
 
 MAX_CHARS = 32000
 
+@per_process
+def openai_client() -> OpenAI:
+    """
+    Process-wide OpenAI client, so its keep-alive connection pool is reused.
+    """
+    return OpenAI(api_key=os.getenv("OPENAI_KEY"), base_url=settings.OPENAI_BASE_URL, timeout=settings.EMBEDDING_TIMEOUT)
+
+@per_process
+def ollama_session():
+    """
+    Process-wide requests session for Ollama (HTTP keep-alive).
+    """
+    import requests
+    return requests.Session()
+
 def _normalize_text_input(text: str) -> list[str]:
     """
     Ensure we return a list of clean strings suitable for OpenAI embeddings.
@@ -35,7 +59,7 @@ def _normalize_text_input(text: str) -> list[str]:
     # truncate to MAX_CHARS (prefer token-aware truncation later)
     if len(text) > MAX_CHARS:
         logger.warning("Truncating input to %d chars for embeddings", MAX_CHARS)
-        item = item[:MAX_CHARS]
+        text = text[:MAX_CHARS]
     normalized = text
 
     return normalized
@@ -45,7 +69,7 @@ def get_openai_embedding(text: str) -> List[float]:
     Returns a single embedding vector for text using OpenAI.
     """
     
-    client = OpenAI(api_key=os.getenv("OPENAI_KEY"))
+    client = openai_client()
 
     input = _normalize_text_input(text)
 
@@ -59,17 +83,17 @@ def get_openai_embedding(text: str) -> List[float]:
     return embeddings
 
     
-def get_ollama_embedding(text: str, model: str = "your-ollama-model") -> List[float]:
+def get_ollama_embedding(text: str, model: str = None) -> List[float]:
     """
     Example placeholder for Ollama/local embeddings.
     Implementation depends on how you run Ollama (HTTP API, CLI, etc).
     Replace this with the exact request to your local Ollama instance.
     """
-    import requests
+    model = model or settings.OLLAMA_EMBEDDING_MODEL
     OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")  # adjust if needed
     # NOTE: adjust path & payload according to your Ollama setup
     try:
-        resp = requests.post(
+        resp = ollama_session().post(
             f"{OLLAMA_URL}/embeddings",
             json={"model": model, "input": text},
             timeout=30,
@@ -83,14 +107,230 @@ def get_ollama_embedding(text: str, model: str = "your-ollama-model") -> List[fl
         logger.exception("Ollama embedding failed")
         raise
 
+def get_local_embeddings(texts: list[str], dimensions: int = None) -> List[List[float]]:
+    """
+    Deterministic in-process embeddings for load tests and offline benchmarks.
+    Character n-grams (LOCAL_EMBEDDING_NGRAM_RANGE) of the case-folded text are
+    hashed with crc32 onto `dimensions` signed buckets and L2-normalized, so texts
+    sharing many n-grams get a high cosine similarity. No network, no model.
+    """
+    dimensions = dimensions or settings.VECTOR_SIZE
+    low, high = settings.LOCAL_EMBEDDING_NGRAM_RANGE
+    matrix = np.zeros((len(texts), dimensions), dtype=np.float32)
+    for row, text in enumerate(texts):
+        text = f" {' '.join(_normalize_text_input(text).split()).casefold()} "
+        hashes = np.fromiter(
+            (zlib.crc32(text[i:i + n].encode("utf-8")) for n in range(low, high + 1) for i in range(len(text) - n + 1)),
+            dtype=np.uint32,
+        )
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        matrix[row] = np.bincount(hashes % dimensions, weights=signs, minlength=dimensions)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).tolist()
+
+def get_local_embedding(text: str) -> List[float]:
+    return get_local_embeddings([text])[0]
+
+def _batch_texts(texts: list[str], max_items: int, max_tokens: int,
+                 token_counts: list[int] = None, provider: str = None) -> list[tuple[list[int], int]]:
+    """
+    Pack input positions into batches bounded by item count and token budget.
+    Returns a list of (indexes into `texts`, token total) tuples, in input order.
+    A single text larger than `max_tokens` gets a batch of its own.
+    Known `token_counts` are reused; missing (falsy) ones are counted here.
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for idx, text in enumerate(texts):
+        tokens = (token_counts and token_counts[idx]) or count_tokens(text, provider)
+        if current and (len(current) >= max_items or current_tokens + tokens > max_tokens):
+            batches.append((current, current_tokens))
+            current = []
+            current_tokens = 0
+        current.append(idx)
+        current_tokens += tokens
+    if current:
+        batches.append((current, current_tokens))
+    return batches
+
+def get_openai_embeddings(texts: list[str]) -> List[List[float]]:
+    """
+    Returns one embedding per text using a single OpenAI request.
+    """
+    client = openai_client()
+
+    inputs = [_normalize_text_input(t) for t in texts]
+
+    resp = client.embeddings.create(
+        model=settings.OPENAI_EMBEDDING_MODEL,
+        input=inputs
+    )
+
+    # the API does not guarantee response order, so sort by the returned index
+    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+
+def get_ollama_embeddings(texts: list[str], model: str = None) -> List[List[float]]:
+    """
+    Batch counterpart of `get_ollama_embedding`.
+    Sends the whole batch in one request when the server returns an "embeddings" list,
+    and falls back to one request per text otherwise.
+    """
+    model = model or settings.OLLAMA_EMBEDDING_MODEL
+    OLLAMA_URL = os.getenv("OLLAMA_URL", "http://localhost:11434")
+    try:
+        resp = ollama_session().post(
+            f"{OLLAMA_URL}/embeddings",
+            json={"model": model, "input": texts},
+            timeout=60,
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if "embeddings" in data and len(data["embeddings"]) == len(texts):
+            return data["embeddings"]
+    except Exception as e:
+        logger.warning("Ollama batch embedding failed, falling back to single requests: %s", e)
+
+    return [get_ollama_embedding(t, model=model) for t in texts]
+
+_call_deadline = threading.local()
+
+@contextmanager
+def embedding_deadline(deadline: float):
+    """
+    Bounds the embedding calls this thread makes inside the block by the
+    time.monotonic() `deadline`: with EMBEDDING_ASYNC a call still running at
+    the deadline is cancelled and raises TimeoutError. Used by search legs.
+    """
+    previous = getattr(_call_deadline, "value", None)
+    _call_deadline.value = deadline
+    try:
+        yield
+    finally:
+        _call_deadline.value = previous
+
+def _remaining_time():
+    deadline = getattr(_call_deadline, "value", None)
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("Embedding deadline passed before the call started")
+    return remaining
+
 def get_embedding(text: str) -> List[float]:
     """
     Dispatch to the configured provider.
     """
+    if settings.EMBEDDING_ASYNC:
+        from document_manager.utilities.async_embeddings import aget_embedding, run_async
+        return run_async(aget_embedding(text), timeout=_remaining_time())
+
     provider = SiteSetting.get_provider()
+    rate_limiter.acquire(provider, count_tokens(text, provider), interactive=True)
     if provider == "openai":
         return get_openai_embedding(text)
     elif provider == "ollama":
         return get_ollama_embedding(text)
+    elif provider == "local":
+        return get_local_embedding(text)
     else:
-        raise RuntimeError(f"Unknown embedding provider: {provider}")
\ No newline at end of file
+        raise RuntimeError(f"Unknown embedding provider: {provider}")
+
+def get_query_embedding(query: str) -> List[float]:
+    """
+    Embedding for a search query, served from the query-embedding cache
+    (in-process LRU, then Redis) when the same normalized query was seen before.
+    """
+    provider = SiteSetting.get_provider()
+    normalized = query_embedding_cache.normalize(query)
+    key = query_embedding_cache.make_key(normalized, provider, get_provider_model(provider), settings.VECTOR_SIZE)
+    cached = query_embedding_cache.get_many([key])
+    if key in cached:
+        return cached[key]
+
+    embedding = get_embedding(normalized)
+    query_embedding_cache.set_many({key: embedding})
+    return embedding
+
+def get_provider_model(provider: str) -> str:
+    """
+    Name of the embedding model used by `provider`; part of the cache key.
+    """
+    if provider == "openai":
+        return settings.OPENAI_EMBEDDING_MODEL
+    if provider == "ollama":
+        return settings.OLLAMA_EMBEDDING_MODEL
+    if provider == "local":
+        low, high = settings.LOCAL_EMBEDDING_NGRAM_RANGE
+        return f"hashed-char-ngrams-{low}-{high}"
+    raise RuntimeError(f"Unknown embedding provider: {provider}")
+
+def get_embeddings(texts: list[str], progress_callback=None, token_counts: list[int] = None) -> List[List[float]]:
+    """
+    Embed many texts with the configured provider.
+    Texts already in the embedding cache are served from it; the rest are
+    de-duplicated and packed into batches of at most EMBEDDING_BATCH_SIZE items
+    and EMBEDDING_BATCH_MAX_TOKENS tokens. The result preserves input order.
+    `progress_callback(done, total)` is called after each batch if given.
+    `token_counts`, if known (e.g. from the chunker), saves re-tokenizing.
+    With EMBEDDING_ASYNC the batches are sent concurrently by the async client.
+    """
+    if not texts:
+        return []
+
+    if settings.EMBEDDING_ASYNC:
+        from document_manager.utilities.async_embeddings import aget_embeddings, run_async
+        embeddings = run_async(aget_embeddings(texts, token_counts=token_counts))
+        if progress_callback:
+            progress_callback(len(texts), len(texts))
+        return embeddings
+
+    provider = SiteSetting.get_provider()
+    if provider == "openai":
+        embed_batch = get_openai_embeddings
+    elif provider == "ollama":
+        embed_batch = get_ollama_embeddings
+    elif provider == "local":
+        embed_batch = get_local_embeddings
+    else:
+        raise RuntimeError(f"Unknown embedding provider: {provider}")
+
+    model = get_provider_model(provider)
+    keys = [embedding_cache.make_key(t, provider, model, settings.VECTOR_SIZE) for t in texts]
+    cached = embedding_cache.get_many(list(set(keys)))
+
+    # one provider input per distinct uncached key
+    pending = {}
+    for i, (text, key) in enumerate(zip(texts, keys)):
+        if key not in cached and key not in pending:
+            pending[key] = i
+    pending_keys = list(pending)
+    pending_texts = [texts[i] for i in pending.values()]
+
+    batches = _batch_texts(
+        pending_texts,
+        max_items=settings.EMBEDDING_BATCH_SIZE,
+        max_tokens=settings.EMBEDDING_BATCH_MAX_TOKENS,
+        token_counts=[token_counts[i] for i in pending.values()] if token_counts else None,
+        provider=provider,
+    )
+    done = len(texts) - len(pending_texts)
+    for batch, batch_tokens in batches:
+        rate_limiter.acquire(provider, batch_tokens, interactive=False)
+        vectors = embed_batch([pending_texts[i] for i in batch])
+        if len(vectors) != len(batch):
+            raise RuntimeError(f"Embedding provider returned {len(vectors)} vectors for {len(batch)} inputs")
+        fresh = {pending_keys[i]: vec for i, vec in zip(batch, vectors)}
+        embedding_cache.set_many(fresh)
+        cached.update(fresh)
+        done += len(batch)
+        if progress_callback:
+            progress_callback(done, len(texts))
+
+    logger.info(
+        "Embedded %d texts (%d from cache) in %d batches; cache stats %s",
+        len(texts), len(texts) - len(pending_texts), len(batches), embedding_cache.get_stats(),
+    )
+    return [cached[key] for key in keys]
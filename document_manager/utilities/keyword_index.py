@@ -0,0 +1,84 @@
+import logging
+import re
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils.module_loading import import_string
+
+from document_manager.models import Chunk
+
+logger = logging.getLogger(__name__)
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class KeywordIndexBackend:
+    """
+    Interface for keyword search over chunk text.
+    `search` returns [(chunk_id, score)] best first, restricted to one owner;
+    higher scores are better.
+    """
+
+    def search(self, query: str, user_id: int, limit: int = 50) -> list[tuple[int, float]]:
+        raise NotImplementedError
+
+
+class IcontainsBackend(KeywordIndexBackend):
+    """
+    Fallback: substring match on the whole query, every hit scores 1.0.
+    Works on any database but scans the chunk table.
+    """
+
+    def search(self, query, user_id, limit=50):
+        ids = Chunk.objects.filter(
+            document__owner_id=user_id,
+            text__icontains=query,
+        ).values_list("id", flat=True)[:limit]
+        return [(chunk_id, 1.0) for chunk_id in ids]
+
+
+class SQLiteFTS5Backend(KeywordIndexBackend):
+    """
+    SQLite FTS5 inverted index ranked with BM25.
+    The FTS table and the triggers that keep it in sync with
+    document_manager_chunk are created by migration 0004_chunk_fts, so
+    bulk_create, queryset deletes and cascades are all covered without
+    application code. Queries OR the terms together and let
+    BM25 rank documents matching more/rarer terms first.
+    """
+
+    table = "document_manager_chunk_fts"
+
+    @staticmethod
+    def build_match(query: str) -> str:
+        terms = TERM_RE.findall(query)
+        # quote every term so FTS5 operators in user input are treated as text
+        return " OR ".join('"{}"'.format(t.replace('"', '""')) for t in terms)
+
+    def search(self, query, user_id, limit=50):
+        match = self.build_match(query)
+        if not match:
+            return []
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT rowid, bm25({self.table}) FROM {self.table} "
+                    f"WHERE {self.table} MATCH %s AND owner_id = %s "
+                    f"ORDER BY bm25({self.table}) LIMIT %s",
+                    [match, user_id, limit],
+                )
+                rows = cursor.fetchall()
+        except DatabaseError as e:
+            logger.warning("FTS5 keyword search failed, falling back to icontains: %s", e)
+            return IcontainsBackend().search(query, user_id, limit)
+        # bm25() is lower-is-better and negative; flip it so higher is better
+        return [(chunk_id, -score) for chunk_id, score in rows]
+
+
+@lru_cache(maxsize=None)
+def get_keyword_backend() -> KeywordIndexBackend:
+    """
+    Backend named by KEYWORD_SEARCH_BACKEND (a dotted path).
+    """
+    return import_string(settings.KEYWORD_SEARCH_BACKEND)()
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+import time
+
+from django.conf import settings
+from django_redis import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Two token buckets (requests, tokens) refilled continuously and updated atomically.
+# KEYS: request bucket, token bucket
+# ARGV: rpm capacity, rpm refill/ms, requests needed,
+#       tpm capacity, tpm refill/ms, tokens needed, reserved fraction
+# Returns 0 when both buckets were debited, otherwise the milliseconds to wait.
+TOKEN_BUCKET_SCRIPT = """
+redis.replicate_commands()
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local reserve = tonumber(ARGV[7])
+local wait = 0
+local levels = {}
+local needs = {}
+for i = 1, 2 do
+    local cap = tonumber(ARGV[(i - 1) * 3 + 1])
+    local rate = tonumber(ARGV[(i - 1) * 3 + 2])
+    local need = tonumber(ARGV[(i - 1) * 3 + 3])
+    local floor = cap * reserve
+    local b = redis.call('HMGET', KEYS[i], 'level', 'ts')
+    local level = tonumber(b[1]) or cap
+    local ts = tonumber(b[2]) or now
+    level = math.min(cap, level + math.max(0, now - ts) * rate)
+    -- a request larger than the usable bucket would never fit; let it drain the bucket instead
+    need = math.min(need, cap - floor)
+    local deficit = need + floor - level
+    if deficit > 0 then
+        wait = math.max(wait, math.ceil(deficit / rate))
+    end
+    levels[i] = level
+    needs[i] = need
+end
+if wait == 0 then
+    for i = 1, 2 do
+        redis.call('HSET', KEYS[i], 'level', levels[i] - needs[i], 'ts', now)
+        redis.call('PEXPIRE', KEYS[i], 120000)
+    end
+end
+return wait
+"""
+
+
+class EmbeddingRateLimiter:
+    """
+    Process-independent RPM/TPM limiter for embedding providers, shared by
+    every web and Celery process through Redis.
+    Bulk callers (ingestion) may only use the buckets down to
+    EMBEDDING_INTERACTIVE_RESERVE of capacity; the rest is kept for
+    interactive query embeddings. If Redis is unreachable the limiter fails open.
+    """
+
+    def __init__(self, cache_alias: str = "default"):
+        self.cache_alias = cache_alias
+        self._script = None
+
+    def _limits(self, provider: str):
+        limits = settings.EMBEDDING_RATE_LIMITS.get(provider)
+        if not limits:
+            return None
+        return limits["rpm"], limits["tpm"]
+
+    def _try_acquire(self, provider: str, tokens: int, interactive: bool) -> float:
+        """
+        Returns 0 when the request may proceed, otherwise seconds to wait.
+        """
+        limits = self._limits(provider)
+        if not settings.EMBEDDING_RATE_LIMIT_ENABLED or limits is None:
+            return 0
+        rpm, tpm = limits
+        reserve = 0 if interactive else settings.EMBEDDING_INTERACTIVE_RESERVE
+        try:
+            if self._script is None:
+                self._script = get_redis_connection(self.cache_alias).register_script(TOKEN_BUCKET_SCRIPT)
+            wait_ms = self._script(
+                keys=[f"ratelimit:{provider}:requests", f"ratelimit:{provider}:tokens"],
+                args=[rpm, rpm / 60000, 1, tpm, tpm / 60000, tokens, reserve],
+            )
+        except Exception as e:
+            logger.warning("Rate limiter unavailable, proceeding without it: %s", e)
+            return 0
+        return int(wait_ms) / 1000
+
+    def acquire(self, provider: str, tokens: int, interactive: bool = False):
+        """Blocks until one request of `tokens` tokens fits in the shared budget."""
+        waited = 0.0
+        while True:
+            wait = self._try_acquire(provider, tokens, interactive)
+            if not wait:
+                break
+            wait = min(wait, settings.EMBEDDING_RATE_LIMIT_MAX_SLEEP)
+            waited += wait
+            time.sleep(wait)
+        if waited:
+            logger.info("Rate limiter delayed %s request (%d tokens) by %.2fs", provider, tokens, waited)
+
+    async def aacquire(self, provider: str, tokens: int, interactive: bool = False):
+        """Async counterpart of `acquire`; the Redis call runs in a thread."""
+        waited = 0.0
+        while True:
+            wait = await asyncio.to_thread(self._try_acquire, provider, tokens, interactive)
+            if not wait:
+                break
+            wait = min(wait, settings.EMBEDDING_RATE_LIMIT_MAX_SLEEP)
+            waited += wait
+            await asyncio.sleep(wait)
+        if waited:
+            logger.info("Rate limiter delayed %s request (%d tokens) by %.2fs", provider, tokens, waited)
+
+
+rate_limiter = EmbeddingRateLimiter()
@@ -0,0 +1,179 @@
+import logging
+import os
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = "runtime_settings:version"
+
+
+def _provider(value: str) -> str:
+    from document_manager.models import SiteSetting
+
+    if value not in dict(SiteSetting.PROVIDER_CHOICES):
+        raise ValueError(f"unknown provider {value!r}")
+    return value
+
+def _positive_int(value) -> int:
+    value = int(value)
+    if value <= 0:
+        raise ValueError("must be positive")
+    return value
+
+def _non_negative_int(value) -> int:
+    value = int(value)
+    if value < 0:
+        raise ValueError("must not be negative")
+    return value
+
+def _chunking_mode(value: str) -> str:
+    if value not in ("chars", "tokens"):
+        raise ValueError("must be 'chars' or 'tokens'")
+    return value
+
+def _similarity(value) -> float:
+    value = float(value)
+    if not 0.0 <= value <= 1.0:
+        raise ValueError("must be between 0 and 1")
+    return value
+
+
+# SiteSetting key -> (settings.py fallback, parser)
+RUNTIME_SETTINGS = {
+    "embedding_provider": ("EMBEDDING_PROVIDER", _provider),
+    "default_similarity_threshold": ("DEFAULT_SIMILARITY_THRESHOLD", _similarity),
+    "chunking_mode": ("CHUNKING_MODE", _chunking_mode),
+    "chunk_max_chars": ("CHUNK_MAX_CHARS", _positive_int),
+    "chunk_overlap_chars": ("CHUNK_OVERLAP_CHARS", _non_negative_int),
+    "chunk_max_tokens": ("CHUNK_MAX_TOKENS", _positive_int),
+    "chunk_overlap_tokens": ("CHUNK_OVERLAP_TOKENS", _non_negative_int),
+}
+# VECTOR_SIZE is deliberately not here: collections keep the dimension they were
+# created with and the providers' output size does not follow it
+
+
+def parse_setting(key: str, value):
+    """
+    Converts a stored SiteSetting value to its runtime type.
+    Raises ValidationError for unknown keys and invalid values.
+    """
+    if key not in RUNTIME_SETTINGS:
+        raise ValidationError(f"Unknown setting {key!r}; expected one of {', '.join(RUNTIME_SETTINGS)}")
+    try:
+        return RUNTIME_SETTINGS[key][1](value)
+    except (TypeError, ValueError) as e:
+        raise ValidationError(f"Invalid value for {key}: {e}")
+
+
+class RuntimeSettings:
+    """
+    SiteSetting rows cached in-process, falling back to settings.py.
+
+    The hot path (every embedding and search) reads a dict. At most once per
+    RUNTIME_SETTINGS_CHECK_INTERVAL seconds a process compares its copy against
+    a version stamp in redis and reloads all rows in one query when it moved;
+    saving or deleting a SiteSetting bumps the stamp (see signals.py), so every
+    web and Celery process picks up a change within the interval.
+    Without redis the rows are simply reloaded every interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._version = None
+        self._checked_at = 0.0
+        os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        # a lock held by another parent thread at fork time would never be released
+        self._lock = threading.Lock()
+
+    def _cache(self):
+        return caches[settings.RUNTIME_SETTINGS_CACHE_ALIAS]
+
+    def _current_version(self):
+        """
+        The shared version stamp; a missing stamp is initialised from the clock,
+        like the search index version. None when redis is unavailable.
+        """
+        try:
+            version = self._cache().get(VERSION_KEY)
+            if version is None:
+                self._cache().add(VERSION_KEY, time.time_ns(), timeout=None)
+                version = self._cache().get(VERSION_KEY)
+            return version
+        except Exception as e:
+            logger.warning("Runtime settings version read failed: %s", e)
+            return None
+
+    def _load(self) -> dict:
+        from document_manager.models import SiteSetting
+
+        values = {}
+        for key, value in SiteSetting.objects.values_list("key", "value"):
+            if key not in RUNTIME_SETTINGS:
+                continue
+            try:
+                values[key] = parse_setting(key, value)
+            except ValidationError as e:
+                logger.error("Ignoring SiteSetting %s: %s", key, e.messages[0])
+        return values
+
+    def is_fresh(self) -> bool:
+        return self._values is not None and time.monotonic() - self._checked_at < settings.RUNTIME_SETTINGS_CHECK_INTERVAL
+
+    def refresh(self) -> dict:
+        with self._lock:
+            if self.is_fresh():
+                return self._values
+            version = self._current_version()
+            if self._values is None or version is None or version != self._version:
+                self._values = self._load()
+                self._version = version
+            self._checked_at = time.monotonic()
+            return self._values
+
+    def _lookup(self, values: dict, key: str):
+        if values is not None and key in values:
+            return values[key]
+        return getattr(settings, RUNTIME_SETTINGS[key][0])
+
+    def get(self, key: str):
+        values = self._values if self.is_fresh() else self.refresh()
+        return self._lookup(values, key)
+
+    async def aget(self, key: str):
+        """
+        Async counterpart of `get`: only a stale copy needs a thread for the
+        redis/database round trip; the event loop itself never touches the ORM.
+        """
+        values = self._values if self.is_fresh() else await sync_to_async(self.refresh, thread_sensitive=False)()
+        return self._lookup(values, key)
+
+    def invalidate(self):
+        """
+        Bumps the shared version so every process reloads on its next check,
+        and drops this process's copy right away.
+        """
+        try:
+            self._cache().incr(VERSION_KEY)
+        except ValueError:
+            # stamp not initialised yet
+            self._cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+        except Exception as e:
+            logger.warning("Runtime settings version bump failed: %s", e)
+        with self._lock:
+            self._values = None
+
+
+runtime_settings = RuntimeSettings()
+
+
+def get_runtime_setting(key: str):
+    return runtime_settings.get(key)
@@ -1,81 +1,186 @@
-from qdrant_client.http import models as rest
-from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait
+import logging
+import time
+from django.db import close_old_connections
 from document_manager.utilities.highlighting import highlight_text
-from .embeddings import get_embedding
-from document_manager.qdrant.qdrant_client import get_similar_documents, search_vectors
+from .embeddings import embedding_deadline, get_query_embedding
+from document_manager.vector_store import get_vector_store
+from document_manager.utilities.sparse import sparse_query_vector
 from document_manager.models import Chunk, Document
+from document_manager.utilities.search_cache import get_cached_results, set_cached_results
+from document_manager.utilities.keyword_index import get_keyword_backend
 from django.conf import settings
 
-def semantic_search(query:str, user_id:int, top_k: int = 20, max_chunks_per_doc=3, similarity_threshold=0.30):
+logger = logging.getLogger(__name__)
+
+# shared pool for running search legs side by side; the keyword leg only talks to
+# the database and gets its own pool, so it never queues behind embedding calls
+_leg_executor = ThreadPoolExecutor(max_workers=settings.SEARCH_LEG_WORKERS, thread_name_prefix="search-leg")
+_keyword_leg_executor = ThreadPoolExecutor(max_workers=settings.SEARCH_KEYWORD_LEG_WORKERS,
+                                           thread_name_prefix="search-keyword-leg")
+
+def _run_leg(deadline, fn, *args, **kwargs):
+    try:
+        if time.monotonic() >= deadline:
+            # queued past the deadline; nobody is waiting for the result any more
+            raise TimeoutError("Search leg started after its deadline")
+        # embedding calls inside the leg are cancelled at the deadline instead of
+        # holding the pool thread through provider timeouts and retries
+        with embedding_deadline(deadline):
+            return fn(*args, **kwargs)
+    finally:
+        # pool threads hold their own DB connections; let Django recycle them
+        close_old_connections()
+
+def run_legs(legs: dict, timeout: float) -> tuple[dict, list]:
+    """
+    Runs {name: (fn, args, kwargs)} concurrently and waits at most `timeout`
+    seconds in total. Returns ({name: result} for legs that finished in time,
+    [names of legs that timed out or failed]). Embedding calls of late legs
+    are cancelled at the deadline; anything else they are blocked on finishes
+    in the background and its result is discarded.
+    """
+    deadline = time.monotonic() + timeout
+    futures = {
+        name: (_keyword_leg_executor if name == "keyword" else _leg_executor).submit(
+            _run_leg, deadline, fn, *args, **kwargs
+        )
+        for name, (fn, args, kwargs) in legs.items()
+    }
+    wait(futures.values(), timeout=timeout)
+
+    results = {}
+    failed = []
+    for name, future in futures.items():
+        if not future.done():
+            logger.warning("Search leg %s missed the %.2fs deadline", name, timeout)
+            failed.append(name)
+        elif future.exception() is not None:
+            logger.error("Search leg %s failed: %s", name, future.exception())
+            failed.append(name)
+        else:
+            results[name] = future.result()
+    return results, failed
+
+def owner_filter(user_id: int) -> dict:
+    return {"owner_id": user_id}
+
+def hydrate_hits(hits: list) -> dict:
+    """
+    Returns {chunk_id: {"document_title", "text"}} for Qdrant hits.
+    With SEARCH_HYDRATION = "payload" text and title come from the point payload
+    (stored at ingestion); anything missing there is loaded from the DB in a
+    single query, which is also the only source in "db" mode.
+    """
+    data, missing = hydrate_from_payload(hits)
+    if missing:
+        for chunk in hydration_queryset(missing):
+            data[chunk.id] = {"document_title": chunk.document.title, "text": chunk.text}
+    return data
+
+def hydrate_from_payload(hits: list) -> tuple[dict, list]:
+    data = {}
+    if settings.SEARCH_HYDRATION == "payload":
+        for hit in hits:
+            payload = hit["payload"]
+            if "text" in payload:
+                data[payload["chunk_id"]] = {"document_title": payload.get("title", ""), "text": payload["text"]}
+
+    missing = [hit["payload"]["chunk_id"] for hit in hits if hit["payload"]["chunk_id"] not in data]
+    return data, missing
+
+def hydration_queryset(chunk_ids: list):
+    return Chunk.objects.filter(id__in=chunk_ids).select_related("document").only("id", "text", "document__title")
+
+def semantic_search(query:str, user_id:int, top_k: int = 10, max_chunks_per_doc=3, similarity_threshold=0.30,
+                    two_stage: bool = None):
+    """
+    Dense search grouped per document by Qdrant: returns up to `top_k`
+    documents with at most `max_chunks_per_doc` chunks each, so one long
+    document cannot crowd the others out of the result set.
+    With `two_stage` (default SEARCH_TWO_STAGE) the chunk search is restricted
+    to the documents whose centroids are closest to the query.
+    """
+    if two_stage is None:
+        two_stage = settings.SEARCH_TWO_STAGE
 
     query = query.strip()
     if not query:
         return []
 
-    # Embed the query
-    embedding = get_embedding(query)
+    # Embed the query (cached per normalized query)
+    embedding = get_query_embedding(query)
 
     # Create filter
-    query_filter = rest.Filter(
-        must=[
-            rest.FieldCondition(
-                key="owner_id",
-                match=rest.MatchValue(value=user_id),
-            )
-        ]
-    )
+    store = get_vector_store()
+    candidates = None
+
+    if two_stage:
+        # Stage 1: candidate documents from the centroid collection
+        candidates = store.search(
+            store.documents_collection,
+            embedding,
+            top_k=settings.SEARCH_TWO_STAGE_CANDIDATES,
+            filters=owner_filter(user_id),
+        )
+    query_filter = semantic_filters(user_id, candidates)
     
-    # Query Qdrant
-    hits = search_vectors(
-        query_embedding=embedding,
+    # Grouped by document in the store; weak chunks are discarded there too
+    groups = store.search(
+        store.chunks_collection,
+        embedding,
         top_k=top_k,
-        filter_payload=query_filter,
+        filters=query_filter,
+        group_by="document_id",
+        group_size=max_chunks_per_doc,
+        score_threshold=similarity_threshold,
     )
 
-    grouped = defaultdict(list)
+    chunk_data = hydrate_hits([hit for group in groups for hit in group["hits"]])
+    return semantic_results(groups, chunk_data)
 
-    # Groups chunks by document
-    for hit in hits:
-        payload = hit["payload"]
-        chunk = None
-        score = hit['score']
-        # Check for threshold
-        if score < similarity_threshold:
-            continue
-            # discard weak chunks
+def semantic_filters(user_id: int, candidates: list = None) -> dict:
+    query_filter = owner_filter(user_id)
+    # no centroids yet (e.g. nothing reindexed since owner_id was added): search everything
+    if candidates:
+        query_filter["document_id"] = [hit["id"] for hit in candidates]
+    return query_filter
 
-        try:
-            chunk = Chunk.objects.select_related("document").get(id=payload['chunk_id'])
-        except Chunk.DoesNotExist:
-            print(f"Chunk does not exist {payload}")
-            continue
-        grouped[payload["document_id"]].append({
-            "chunk_id":payload['chunk_id'],
-            "score": hit["score"],
-            "document_title": chunk.document.title,
-            "text": chunk.text,
-        })
-    
+def semantic_results(groups: list, chunk_data: dict) -> list:
+    """
+    Document-level results from grouped chunk hits and their hydrated text.
+    """
     results = []
 
-    # Build document level results
-    for document_id, chunks in grouped.items():
-        # sort chunks by score (desc)
-        chunks.sort(key=lambda c: c["score"], reverse=True)
-
-        top_chunks = chunks[:max_chunks_per_doc]
+    # Build document level results; groups and their hits arrive best first
+    for group in groups:
+        chunks = []
+        for hit in group["hits"]:
+            payload = hit["payload"]
+            data = chunk_data.get(payload["chunk_id"])
+            if data is None:
+                print(f"Chunk does not exist {payload}")
+                continue
+            chunks.append({
+                "chunk_id":payload['chunk_id'],
+                "score": hit["score"],
+                "document_title": data["document_title"],
+                "text": data["text"],
+            })
+        if not chunks:
+            continue
 
         results.append({
-            "document_id": document_id,
-            "document_title": top_chunks[0]["document_title"],
-            "best_score": round(top_chunks[0]["score"], 3),
+            "document_id": group["group_id"],
+            "document_title": chunks[0]["document_title"],
+            "best_score": round(chunks[0]["score"], 3),
             "chunks": [
                 {
                     "score": round(c["score"], 3),
                     "snippet": c['text'],
                     "chunk_id":c['chunk_id']
                 }
-                for c in top_chunks
+                for c in chunks
             ],
             "matched_chunks": len(chunks),
         })
@@ -86,23 +191,29 @@ def semantic_search(query:str, user_id:int, top_k: int = 20, max_chunks_per_doc=
 
 def keyword_search(query: str, user_id:int):
     """
-    Simple keyword search on chunk text.
-    Returns list of dicts shaped like semantic hits.
+    Keyword search on chunk text through the configured keyword index backend.
+    Returns list of dicts shaped like semantic hits; scores are the backend's
+    relevance (BM25 for FTS5) scaled so the best hit scores 1.0.
     """
     if not query:
         return []
-    
-    qs = Chunk.objects.filter(
-        document__owner_id=user_id,
-        text__icontains=query,
-    ).select_related("document")[:50]  # limit
+
+    ranked = get_keyword_backend().search(query, user_id, limit=50)
+    if not ranked:
+        return []
+
+    top_score = max(score for _, score in ranked) or 1.0
+    chunks = Chunk.objects.filter(id__in=[chunk_id for chunk_id, _ in ranked]).select_related("document").in_bulk()
 
     results = []
-    for chunk in qs:
+    for chunk_id, score in ranked:
+        chunk = chunks.get(chunk_id)
+        if chunk is None:
+            continue
         results.append({
             "document_id": chunk.document.id,
             "document_title": chunk.document.title,
-            "score": 1.0,  # full credit for keyword match
+            "score": round(score / top_score, 3),
             "text": chunk.text,
             "chunk_id":chunk.id
         })
@@ -115,19 +226,21 @@ def similar_documents(doc_id, limit=5):
     if not doc.doc_vector:
         return []
 
-    res = get_similar_documents(doc.doc_vector,limit)
+    res = get_vector_store().similar_documents(doc.doc_vector, limit + 1)  # include itself
+    return related_documents(res, doc_id, limit)
 
+def related_documents(res: list, doc_id: int, limit: int) -> list:
     related = []
 
     for hit in res:
-        if hit.id == doc_id:
+        if hit["id"] == doc_id:
             continue  # skip self
 
-        payload = hit.payload
+        payload = hit["payload"]
         related.append({
-            "document_id": hit.id,
+            "document_id": hit["id"],
             "title": payload["title"],
-            "score": round(hit.score, 3),
+            "score": round(hit["score"], 3),
         })
 
         if len(related) >= limit:
@@ -138,17 +251,57 @@ def similar_documents(doc_id, limit=5):
     
 
 
-def hybrid_search(query, user_id, threshold=0.75):
+def native_hybrid_hits(query: str, user_id: int, threshold: float, top_k: int = 20):
+    """
+    Dense + sparse retrieval fused by Qdrant (RRF) in a single request.
+    Returns flat hits in the same shape as keyword_search.
+    """
+    query = query.strip()
+    if not query:
+        return []
 
-    # 1. Get semantic hits
-    semantic_hits = semantic_search(
-        query=query,
-        user_id=user_id,
-        similarity_threshold=threshold,
+    hits = get_vector_store().hybrid_search(
+        get_query_embedding(query),
+        sparse_query_vector(query),
+        top_k=top_k,
+        filters=owner_filter(user_id),
+        score_threshold=threshold,
     )
+    return flatten_hybrid_hits(hits, hydrate_hits(hits))
+
+def flatten_hybrid_hits(hits: list, chunk_data: dict) -> list:
+    flat = []
+    for hit in hits:
+        payload = hit["payload"]
+        data = chunk_data.get(payload["chunk_id"])
+        if data is None:
+            continue
+        flat.append({
+            "document_id": payload["document_id"],
+            "document_title": data["document_title"],
+            "score": round(hit["score"], 3),
+            "text": data["text"],
+            "chunk_id": payload["chunk_id"],
+            "source": "hybrid",
+        })
+    return flat
+
+def merged_leg_hits(query: str, user_id: int, threshold: float):
+    """
+    Runs the semantic (Qdrant) and keyword (SQL) legs concurrently and merges
+    their flat hits, deduplicated by (document_id, text).
+    Returns (hits, names of legs that missed SEARCH_LEG_TIMEOUT or failed).
+    """
+    # 1 + 2. Semantic and keyword legs, side by side
+    legs, failed = run_legs({
+        "semantic": (semantic_search, (), {"query": query, "user_id": user_id, "similarity_threshold": threshold}),
+        "keyword": (keyword_search, (query, user_id), {}),
+    }, timeout=settings.SEARCH_LEG_TIMEOUT)
+    return merge_leg_hits(legs.get("semantic", []), legs.get("keyword", [])), failed
 
-    # 2. Get keyword hits (raw, not aggregated)
-    kw_hits = keyword_search(query, user_id)
+def merge_leg_hits(semantic_hits: list, kw_hits: list) -> list:
+    for hit in kw_hits:
+        hit["source"] = "keyword"
 
     # Convert semantic results to same flat format
     flat_semantic = []
@@ -159,7 +312,8 @@ def hybrid_search(query, user_id, threshold=0.75):
                 "document_title": doc["document_title"],
                 "score": c["score"],
                 "text": c["snippet"], 
-                "chunk_id":c['chunk_id']
+                "chunk_id":c['chunk_id'],
+                "source": "semantic",
             })
     
     # 3. Merge + dedupe by (document_id, text)
@@ -172,8 +326,72 @@ def hybrid_search(query, user_id, threshold=0.75):
         if key not in seen:
             seen.add(key)
             merged.append(entry)
+    return merged
+
+def native_or_keyword_hits(query: str, user_id: int, threshold: float):
+    """
+    Native hybrid search under SEARCH_LEG_TIMEOUT; keyword-only results are
+    served when it is late or fails. The keyword leg starts after the failure
+    (SEARCH_KEYWORD_FALLBACK = "after") or alongside every native search
+    ("concurrent").
+    Returns (hits, names of legs that missed the deadline or failed).
+    """
+    legs = {"hybrid": (native_hybrid_hits, (query, user_id, threshold), {})}
+    keyword_leg = (keyword_search, (query, user_id), {})
+    if settings.SEARCH_KEYWORD_FALLBACK == "concurrent":
+        legs["keyword"] = keyword_leg
+    legs, failed = run_legs(legs, timeout=settings.SEARCH_LEG_TIMEOUT)
+
+    if "hybrid" not in legs and "keyword" not in legs and "keyword" not in failed:
+        fallback, fallback_failed = run_legs({"keyword": keyword_leg}, timeout=settings.SEARCH_LEG_TIMEOUT)
+        legs.update(fallback)
+        failed += fallback_failed
+    return hybrid_or_keyword(legs, failed)
+
+def hybrid_or_keyword(legs: dict, failed: list) -> tuple[list, list]:
+    """
+    Picks the native hybrid hits, or the keyword fallback if the native leg
+    did not make it. Failures of the unused fallback are not reported.
+    """
+    if "hybrid" in legs:
+        return legs["hybrid"], [name for name in failed if name != "keyword"]
+
+    kw_hits = legs.get("keyword", [])
+    for hit in kw_hits:
+        hit["source"] = "keyword"
+    return kw_hits, failed
+
+def run_hybrid_search(query, user_id, threshold=0.75):
+    """
+    Hybrid search with status. Returns
+        {"results": [...], "degraded": bool, "failed_legs": [...]}
+    where `degraded` means some leg missed its deadline or failed and the
+    results come from the legs that did finish. Degraded results are not cached.
+    """
+
+    # Served from the per-user cache until the user's index version changes
+    cached = get_cached_results(user_id, query, threshold)
+    if cached is not None:
+        return {"results": cached, "degraded": False, "failed_legs": []}
+
+    # "native" fuses dense and sparse retrieval inside Qdrant; collections
+    # created without the sparse vector fall back to the two-leg merge
+    if settings.HYBRID_SEARCH_MODE == "native" and get_vector_store().supports_sparse():
+        merged, failed = native_or_keyword_hits(query, user_id, threshold)
+    else:
+        merged, failed = merged_leg_hits(query, user_id, threshold)
     
-    # 4. Reaggregate using existing logic
+    final = group_hits(merged, query, threshold)
+    if not failed:
+        set_cached_results(user_id, query, threshold, final)
+    return {"results": final, "degraded": bool(failed), "failed_legs": failed}
+
+def group_hits(merged: list, query: str, threshold: float) -> list:
+    """
+    Reaggregates flat hits into document-level results, best document first.
+    `score_type` is "rank" for native hybrid hits, whose scores are fused RRF
+    ranks rather than cosine similarities, and "similarity" otherwise.
+    """
     grouped = {}
     for entry in merged:
         grouped.setdefault(entry["document_id"], []).append(entry)
@@ -186,13 +404,15 @@ def hybrid_search(query, user_id, threshold=0.75):
             "document_id": doc_id,
             "document_title": top[0]["document_title"],
             "best_score": round(top[0]["score"], 3),
+            "score_type": "rank" if top[0].get("source") == "hybrid" else "similarity",
             "embedding_model":settings.OPENAI_EMBEDDING_MODEL,
             "threshold":threshold,
             "chunks": [
                 {
                     "score": c["score"],
                     "snippet": highlight_text(c["text"], query),
-                    "chunk_index":c['chunk_id']
+                    "chunk_index":c['chunk_id'],
+                    "source": c.get("source", "semantic"),
                 }
                 for c in top
             ],
@@ -201,9 +421,14 @@ def hybrid_search(query, user_id, threshold=0.75):
     
 
     final.sort(key=lambda r: r["best_score"], reverse=True)
-
     return final
 
+def hybrid_search(query, user_id, threshold=0.75):
+    """
+    Hybrid search results only; see `run_hybrid_search` for the degraded flag.
+    """
+    return run_hybrid_search(query, user_id, threshold)["results"]
+
 def explain_single_document(document_id, query, threshold, user_id):
     """
     Returns structured explanation for why this document matched.
@@ -214,13 +439,16 @@ def explain_single_document(document_id, query, threshold, user_id):
         user_id=user_id,
         threshold=threshold,
     )
+    return build_explanation(results, document_id, threshold)
 
+def build_explanation(results: list, document_id: int, threshold: float):
     for r in results:
         if r["document_id"] == document_id:
             print(r['chunks'])
             return {
                 "document_title": r["document_title"],
                 "best_score": r["best_score"],
+                "score_type": r.get("score_type", "similarity"),
                 "matched_chunks": r["matched_chunks"],
                 "embedding_model": r.get("embedding_model"),
                 "threshold": threshold,
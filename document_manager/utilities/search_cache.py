@@ -0,0 +1,65 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def _cache():
+    return caches[settings.SEARCH_RESULT_CACHE_ALIAS]
+
+def _version_key(user_id: int) -> str:
+    return f"search:index_version:{user_id}"
+
+def get_index_version(user_id: int) -> int:
+    """
+    Current index version for a user's documents.
+    A missing counter is initialised from the clock, so a counter that was
+    evicted can never come back with a value old cached results were stored under.
+    """
+    key = _version_key(user_id)
+    version = _cache().get(key)
+    if version is None:
+        _cache().add(key, time.time_ns(), timeout=None)
+        version = _cache().get(key)
+    return version
+
+def bump_index_version(user_id: int):
+    """
+    Invalidates every cached search result of `user_id`. Call whenever the
+    user's searchable content changes (upload, reindex, delete).
+    """
+    key = _version_key(user_id)
+    try:
+        _cache().incr(key)
+    except ValueError:
+        # counter not initialised yet
+        _cache().set(key, time.time_ns(), timeout=None)
+
+def _result_key(user_id: int, query: str, threshold: float) -> str:
+    normalized = " ".join(query.split()).casefold()
+    digest = hashlib.sha256(f"{normalized}\x1f{threshold}".encode("utf-8")).hexdigest()
+    return f"search:results:{user_id}:{get_index_version(user_id)}:{digest}"
+
+def get_cached_results(user_id: int, query: str, threshold: float):
+    """
+    Returns the cached hybrid search results, or None.
+    """
+    if not settings.SEARCH_RESULT_CACHE_ENABLED:
+        return None
+    try:
+        return _cache().get(_result_key(user_id, query, threshold))
+    except Exception as e:
+        logger.warning("Search result cache read failed: %s", e)
+        return None
+
+def set_cached_results(user_id: int, query: str, threshold: float, results: list):
+    if not settings.SEARCH_RESULT_CACHE_ENABLED:
+        return
+    try:
+        _cache().set(_result_key(user_id, query, threshold), results, timeout=settings.SEARCH_RESULT_CACHE_TTL)
+    except Exception as e:
+        logger.warning("Search result cache write failed: %s", e)
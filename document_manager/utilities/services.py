@@ -1,18 +1,26 @@
 from document_manager.models import Document, Chunk
-from document_manager.qdrant.qdrant_client import delete_document_vectors
+from document_manager.vector_store import get_vector_store
+from document_manager.utilities.search_cache import bump_index_version
 
 
-def reset_document_for_reindex(document: Document):
+def reset_document_for_reindex(document: Document, incremental: bool = False):
+    """
+    Prepares a document for `process_document`.
+    A full reset drops all vectors and chunks. An incremental reset keeps them,
+    so search keeps serving the old vectors until the reindex has diffed and
+    replaced only the chunks that changed.
+    """
 
+    if not incremental:
+        # Delete vectors from the vector store
+        get_vector_store().delete_document(document.id)
 
-    # Delete vectors from Qdrant
-    delete_document_vectors(document.id)
-
-    # Delete chunks from DB
-    Chunk.objects.filter(document=document).delete()
+        # Delete chunks from DB
+        Chunk.objects.filter(document=document).delete()
+        document.content_text = ""
+        bump_index_version(document.owner_id)
 
     # Reset document fields
     document.status = "pending"
     document.progress = 0
-    document.content_text = ""
-    document.save(update_fields=["status", "content_text"])
\ No newline at end of file
+    document.save(update_fields=["status", "progress", "content_text"])
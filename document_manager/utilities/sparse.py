@@ -0,0 +1,34 @@
+import re
+import zlib
+from collections import Counter
+
+TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+# BM25 term-frequency saturation; IDF is applied by Qdrant (Modifier.IDF)
+BM25_K1 = 1.2
+
+
+def _terms(text: str) -> list[str]:
+    return [t for t in TERM_RE.findall(text.casefold()) if len(t) > 1]
+
+def _term_index(term: str) -> int:
+    # stable across processes (unlike hash()), fits Qdrant's uint32 indices
+    return zlib.crc32(term.encode("utf-8"))
+
+def sparse_document_vector(text: str) -> tuple[list[int], list[float]]:
+    """
+    Lexical sparse vector for a chunk: one dimension per hashed term,
+    weighted by saturated term frequency.
+    """
+    weights = {}
+    for term, tf in Counter(_terms(text)).items():
+        idx = _term_index(term)
+        weights[idx] = weights.get(idx, 0.0) + tf * (BM25_K1 + 1) / (tf + BM25_K1)
+    return list(weights.keys()), list(weights.values())
+
+def sparse_query_vector(query: str) -> tuple[list[int], list[float]]:
+    """
+    Lexical sparse vector for a query: every distinct term weighs 1.0.
+    """
+    indices = sorted({_term_index(t) for t in _terms(query)})
+    return indices, [1.0] * len(indices)
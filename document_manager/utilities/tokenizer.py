@@ -1,9 +1,31 @@
+from functools import lru_cache
+
 import tiktoken
 from django.conf import settings
 
-def count_tokens(text: str) -> int:
+# rough size of a token in English text, for providers without a tokenizer
+CHARS_PER_TOKEN = 4
+
+@lru_cache(maxsize=None)
+def _encoding_for(model: str) -> tiktoken.Encoding:
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        # non-OpenAI models (e.g. Ollama): cl100k is a close enough estimate for budgeting
+        return tiktoken.get_encoding("cl100k_base")
+
+def get_encoding() -> tiktoken.Encoding:
+    """
+    Tokenizer for the configured embedding model, built once per process.
+    """
+    return _encoding_for(settings.OPENAI_EMBEDDING_MODEL)
+
+def count_tokens(text: str, provider: str = None) -> int:
     """
     Count tokens for OpenAI-compatible models.
+    The "local" provider gets a character-based estimate instead: it has no
+    tokenizer and must work offline, while tiktoken downloads its encoder on first use.
     """
-    encoding = tiktoken.encoding_for_model(settings.OPENAI_EMBEDDING_MODEL)
-    return len(encoding.encode(text))
\ No newline at end of file
+    if provider == "local":
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(get_encoding().encode_ordinary(text))
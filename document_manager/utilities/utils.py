@@ -2,28 +2,45 @@ import os
 from PyPDF2 import PdfReader
 from docx import Document as DocxDocument
 
+TEXT_READ_BLOCK = 64 * 1024
 
-def extract_text_from_file(path):
-    
+
+def iter_text_segments(path):
+    """
+    Yields (text, fraction_done) pieces of a file's text, one page/paragraph/block
+    at a time, so large files are never held in memory as a single string.
+    Concatenating the pieces gives exactly the output of `extract_text_from_file`.
+    """
     ext = os.path.splitext(path)[1].lower()
 
     if ext == ".txt" or ext == '.md':
+        size = os.path.getsize(path) or 1
         with open(path, "r", encoding="utf-8", errors="ignore") as f:
-            return f.read()
-    
+            while True:
+                block = f.read(TEXT_READ_BLOCK)
+                if not block:
+                    break
+                yield block, min(f.buffer.tell() / size, 1.0)
+        return
+
     if ext == ".pdf":
         reader = PdfReader(path)
-        parts = []
-        for page in reader.pages:
+        total = len(reader.pages) or 1
+        for i, page in enumerate(reader.pages):
             text = page.extract_text() or ""
-            parts.append(text)
-        return "\n".join(parts)
+            yield ("\n" if i else "") + text, (i + 1) / total
+        return
 
     if ext == ".docx":
         doc = DocxDocument(path)
-        parts = [p.text for p in doc.paragraphs]
-        return "\n".join(parts)
+        total = len(doc.paragraphs) or 1
+        for i, p in enumerate(doc.paragraphs):
+            yield ("\n" if i else "") + p.text, (i + 1) / total
+        return
 
     raise ValueError("Unsupported file format for text extraction")
-    
-    
+
+
+def extract_text_from_file(path):
+
+    return "".join(text for text, _ in iter_text_segments(path))
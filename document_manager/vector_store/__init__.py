@@ -0,0 +1,14 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .base import VectorStore
+
+
+@lru_cache(maxsize=None)
+def get_vector_store() -> VectorStore:
+    """
+    Backend named by VECTOR_STORE_BACKEND (a dotted path).
+    """
+    return import_string(settings.VECTOR_STORE_BACKEND)()
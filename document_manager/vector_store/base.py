@@ -0,0 +1,92 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+
+class VectorStore:
+    """
+    Interface for the vector database behind chunk and document-centroid search.
+
+    Points are (id, vector, payload[, sparse]) tuples, where sparse is an optional
+    (indices, values) pair used by backends with native hybrid search. Filters are
+    plain dicts of payload conditions ANDed together: {"owner_id": 3} matches one
+    value, {"document_id": [1, 2]} matches any of the listed values.
+    Search hits are {"id", "score", "payload"} dicts, best first; higher scores are better.
+    """
+
+    def ensure_collections(self):
+        """Creates the chunk and document collections if they do not exist."""
+        raise NotImplementedError
+
+    def supports_sparse(self) -> bool:
+        """Whether `hybrid_search` (dense + sparse fusion) is available."""
+        return False
+
+    def upsert(self, collection: str, points: list[tuple]) -> list:
+        """Inserts or replaces points; returns the written ids."""
+        raise NotImplementedError
+
+    def search(self, collection: str, vector: list, top_k: int = 10, filters: dict = None,
+               score_threshold: float = None, group_by: str = None, group_size: int = 3, **options) -> list:
+        """
+        Nearest neighbours by cosine similarity.
+        Without `group_by` returns up to `top_k` hits. With `group_by` (a payload key)
+        returns up to `top_k` groups as [{"group_id", "hits": [...]}], each with at most
+        `group_size` hits. `options` are backend-specific tuning knobs and may be ignored.
+        """
+        raise NotImplementedError
+
+    def hybrid_search(self, vector: list, sparse: tuple, top_k: int = 10, filters: dict = None,
+                      score_threshold: float = None) -> list:
+        """Dense + sparse search over chunks, fused into one ranking."""
+        raise NotImplementedError
+
+    # Async counterparts for the async search views. The defaults run the sync
+    # method in a worker thread; backends with a native async client override them.
+
+    async def asupports_sparse(self) -> bool:
+        return await sync_to_async(self.supports_sparse, thread_sensitive=False)()
+
+    async def asearch(self, collection: str, vector: list, top_k: int = 10, filters: dict = None,
+                      score_threshold: float = None, group_by: str = None, group_size: int = 3, **options) -> list:
+        return await sync_to_async(self.search, thread_sensitive=False)(
+            collection, vector, top_k=top_k, filters=filters, score_threshold=score_threshold,
+            group_by=group_by, group_size=group_size, **options,
+        )
+
+    async def ahybrid_search(self, vector: list, sparse: tuple, top_k: int = 10, filters: dict = None,
+                             score_threshold: float = None) -> list:
+        return await sync_to_async(self.hybrid_search, thread_sensitive=False)(
+            vector, sparse, top_k=top_k, filters=filters, score_threshold=score_threshold,
+        )
+
+    async def asimilar_documents(self, vector: list, limit: int = 5, filters: dict = None) -> list:
+        return await self.asearch(self.documents_collection, vector, top_k=limit, filters=filters)
+
+    def delete(self, collection: str, ids: list = None, filters: dict = None):
+        """Deletes points by id, or every point matching `filters`."""
+        raise NotImplementedError
+
+    def retrieve(self, collection: str, ids: list) -> dict:
+        """Returns {id: vector} for the ids that exist."""
+        raise NotImplementedError
+
+    def scroll(self, collection: str, filters: dict = None, with_vectors: bool = True):
+        """Iterates over matching points as {"id", "vector", "payload"} dicts."""
+        raise NotImplementedError
+
+    def delete_document(self, document_id: int):
+        """Removes a document's chunk points and its centroid."""
+        self.delete(self.chunks_collection, filters={"document_id": document_id})
+        self.delete(self.documents_collection, filters={"document_id": document_id})
+
+    def similar_documents(self, vector: list, limit: int = 5, filters: dict = None) -> list:
+        """Documents whose centroid is closest to `vector`."""
+        return self.search(self.documents_collection, vector, top_k=limit, filters=filters)
+
+    @property
+    def chunks_collection(self) -> str:
+        return settings.CHUNKS_COLLECTION_NAME
+
+    @property
+    def documents_collection(self) -> str:
+        return settings.DOCUMENT_COLLECTION_NAME
@@ -0,0 +1,420 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .base import VectorStore
+
+logger = logging.getLogger(__name__)
+
+# payload keys with an in-memory inverted index; other keys are matched by scanning payloads
+INDEXED_FIELDS = ("owner_id", "document_id")
+# stamp of in-memory state that must be rebuilt from disk on next access
+_STALE = object()
+
+
+def _as_values(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+
+class _Collection:
+    """
+    One collection on disk:
+        <name>.npy   float32 matrix, one row per point (memory-mapped, grown by doubling)
+        <name>.json  snapshot {"ids": [...], "payloads": [...]} aligned with the rows; free rows have id null
+        <name>.log   JSON lines appended since the snapshot: {"row", "id", "payload"} puts, {"row"} deletes
+    A write appends only the rows it changed to the log, so its cost follows the
+    batch, not the collection. Once the log outgrows the snapshot (and
+    LOG_COMPACT_MIN_BYTES) the writer folds it into a new snapshot.
+    Writers hold an exclusive flock on <name>.lock; readers hold a shared flock and
+    replay only the log lines they have not seen yet, so web and Celery processes
+    on the same box see each other's writes without reloading everything.
+    Limits: ids and payloads of every point stay in memory in each process, and a
+    new process (or one that missed a compaction) parses the whole snapshot, so
+    this is meant for collections up to a few hundred thousand points.
+    """
+
+    LOG_COMPACT_MIN_BYTES = 8 * 1024 * 1024
+
+    def __init__(self, root: Path, name: str, dim: int):
+        self.vectors_path = root / f"{name}.npy"
+        self.state_path = root / f"{name}.json"
+        self.log_path = root / f"{name}.log"
+        self.lock_path = root / f"{name}.lock"
+        self.dim = dim
+        self._thread_lock = threading.RLock()
+        self._stamp = None  # snapshot file identity the in-memory state was built from
+        self._log_offset = 0  # bytes of the log already applied
+        self._vectors_ino = None
+        self._pending = []  # log records of the current write
+        self.ids = []
+        self.payloads = []
+        self.vectors = np.zeros((0, dim), dtype=np.float32)
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.row_of = {}
+        self.index = {field: {} for field in INDEXED_FIELDS}
+
+    # -- persistence --------------------------------------------------------
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.state_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _open_vectors(self):
+        """
+        (Re)maps the matrix if another process replaced it while growing it.
+        Norms of rows already known are kept; new capacity starts empty.
+        """
+        try:
+            ino = os.stat(self.vectors_path).st_ino
+        except FileNotFoundError:
+            ino = None
+        if ino == self._vectors_ino:
+            return
+        if ino is None:
+            self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        else:
+            self.vectors = np.load(self.vectors_path, mmap_mode="r+")
+            if self.vectors.shape[1] != self.dim:
+                raise ValueError(f"{self.vectors_path} holds {self.vectors.shape[1]}-d vectors, expected {self.dim}")
+        self._vectors_ino = ino
+        self._resize_row_arrays(self.vectors.shape[0])
+
+    def _resize_row_arrays(self, capacity: int):
+        extra = capacity - len(self.norms)
+        if extra > 0:
+            self.norms = np.concatenate([self.norms, np.zeros(extra, dtype=np.float32)])
+            self.alive = np.concatenate([self.alive, np.zeros(extra, dtype=bool)])
+
+    def _load_snapshot(self, stamp):
+        if stamp is None:
+            self.ids, self.payloads = [], []
+        else:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            self.ids, self.payloads = state["ids"], state["payloads"]
+
+        self._vectors_ino = None
+        self.norms = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self._open_vectors()
+        n = len(self.ids)
+        self.alive[:n] = [point_id is not None for point_id in self.ids]
+        if n:
+            self.norms[:n] = np.linalg.norm(self.vectors[:n], axis=1)
+        self.row_of = {point_id: row for row, point_id in enumerate(self.ids) if point_id is not None}
+        self.index = {field: {} for field in INDEXED_FIELDS}
+        for row, payload in enumerate(self.payloads):
+            if payload is not None:
+                self._index_add(row, payload)
+        self._stamp = stamp
+        self._log_offset = 0
+
+    def _replay_log(self):
+        try:
+            with open(self.log_path, "rb") as f:
+                f.seek(self._log_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+        # only whole lines; a torn last line from a crashed writer is ignored
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            if line:
+                self._apply(json.loads(line))
+        self._log_offset += len(complete)
+
+    def _apply(self, record: dict):
+        row = record["row"]
+        if row >= len(self.ids):
+            self.ids.extend([None] * (row + 1 - len(self.ids)))
+            self.payloads.extend([None] * (row + 1 - len(self.payloads)))
+        if self.payloads[row] is not None:
+            self._index_remove(row, self.payloads[row])
+            self.row_of.pop(self.ids[row], None)
+
+        if "id" in record:
+            self.ids[row] = record["id"]
+            self.payloads[row] = record["payload"]
+            self.row_of[record["id"]] = row
+            self._index_add(row, record["payload"])
+            self.alive[row] = True
+            self.norms[row] = np.linalg.norm(self.vectors[row])
+        else:
+            self.ids[row] = None
+            self.payloads[row] = None
+            self.alive[row] = False
+
+    def _refresh(self):
+        stamp = self._file_stamp()
+        if stamp != self._stamp:
+            self._load_snapshot(stamp)
+        else:
+            self._open_vectors()
+        self._replay_log()
+
+    def _save(self):
+        if not self._pending:
+            return
+        if isinstance(self.vectors, np.memmap):
+            self.vectors.flush()
+        try:
+            if os.path.getsize(self.log_path) > self._log_offset:
+                # drop a torn line left by a writer that crashed mid-append
+                os.truncate(self.log_path, self._log_offset)
+        except FileNotFoundError:
+            pass
+        with open(self.log_path, "ab") as f:
+            f.write(b"".join(json.dumps(record).encode("utf-8") + b"\n" for record in self._pending))
+            self._log_offset = f.tell()
+        self._pending = []
+
+        snapshot_size = self._stamp[2] if isinstance(self._stamp, tuple) else 0
+        if self._log_offset > max(snapshot_size, self.LOG_COMPACT_MIN_BYTES):
+            self._compact()
+
+    def _compact(self):
+        tmp = self.state_path.with_suffix(".json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({"ids": self.ids, "payloads": self.payloads}, f)
+        os.replace(tmp, self.state_path)
+        # a crash before the truncate only means the log is replayed onto a snapshot
+        # that already contains it, which converges to the same rows
+        open(self.log_path, "wb").close()
+        self._stamp = self._file_stamp()
+        self._log_offset = 0
+
+    @contextmanager
+    def _locked(self, exclusive: bool):
+        with self._thread_lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                self._refresh()
+                try:
+                    yield
+                except BaseException:
+                    # drop half-applied in-memory changes; the next access reloads from disk
+                    self._stamp = _STALE
+                    self._pending = []
+                    raise
+                if exclusive:
+                    self._save()
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def reading(self):
+        return self._locked(exclusive=False)
+
+    def writing(self):
+        return self._locked(exclusive=True)
+
+    # -- rows and indexes ---------------------------------------------------
+
+    def _index_add(self, row: int, payload: dict):
+        for field in INDEXED_FIELDS:
+            if field in payload:
+                self.index[field].setdefault(payload[field], set()).add(row)
+
+    def _index_remove(self, row: int, payload: dict):
+        for field in INDEXED_FIELDS:
+            rows = self.index[field].get(payload.get(field))
+            if rows is not None:
+                rows.discard(row)
+
+    def _grow(self, needed: int):
+        capacity = self.vectors.shape[0]
+        if needed <= capacity:
+            return
+        new_capacity = max(1024, capacity * 2, needed)
+        tmp = self.vectors_path.with_suffix(".npy.tmp")
+        grown = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(new_capacity, self.dim))
+        grown[:capacity] = self.vectors[:capacity]
+        grown.flush()
+        del grown
+        os.replace(tmp, self.vectors_path)
+        self._open_vectors()
+
+    def upsert(self, points: list[tuple]) -> list:
+        # validate everything before touching the matrix
+        vectors = []
+        for point in points:
+            point_id, vector = point[:2]
+            if vector is None:
+                raise ValueError(f"Point {point_id} has no vector")
+            vector = np.asarray(vector, dtype=np.float32)
+            if vector.shape != (self.dim,):
+                raise ValueError(f"Point {point_id} has shape {vector.shape}, expected ({self.dim},)")
+            vectors.append(vector)
+
+        free_rows = [row for row, point_id in enumerate(self.ids) if point_id is None]
+        new = len({point[0] for point in points} - self.row_of.keys())
+        self._grow(len(self.ids) + max(0, new - len(free_rows)))
+
+        written = []
+        for point, vector in zip(points, vectors):
+            point_id, payload = point[0], point[2]
+            row = self.row_of.get(point_id)
+            if row is not None:
+                self._index_remove(row, self.payloads[row])
+            elif free_rows:
+                row = free_rows.pop()
+            else:
+                row = len(self.ids)
+                self.ids.append(None)
+                self.payloads.append(None)
+
+            self.vectors[row] = vector
+            self.norms[row] = np.linalg.norm(vector)
+            self.alive[row] = True
+            self.ids[row] = point_id
+            self.payloads[row] = payload or {}
+            self.row_of[point_id] = row
+            self._index_add(row, self.payloads[row])
+            self._pending.append({"row": row, "id": point_id, "payload": self.payloads[row]})
+            written.append(point_id)
+        return written
+
+    def delete_rows(self, rows):
+        for row in rows:
+            row = int(row)
+            self._index_remove(row, self.payloads[row])
+            self.row_of.pop(self.ids[row], None)
+            self.ids[row] = None
+            self.payloads[row] = None
+            self.alive[row] = False
+            self._pending.append({"row": row})
+
+    def rows_for_ids(self, ids: list) -> np.ndarray:
+        return np.array([self.row_of[i] for i in ids if i in self.row_of], dtype=np.int64)
+
+    def rows_matching(self, filters: dict = None) -> np.ndarray:
+        n = len(self.ids)
+        if not filters:
+            return np.flatnonzero(self.alive[:n])
+        rows = None
+        for key, value in filters.items():
+            values = _as_values(value)
+            if key in self.index:
+                matched = set()
+                for v in values:
+                    matched |= self.index[key].get(v, set())
+            else:
+                matched = {
+                    row for row, payload in enumerate(self.payloads)
+                    if payload is not None and payload.get(key) in values
+                }
+            rows = matched if rows is None else rows & matched
+            if not rows:
+                break
+        return np.array(sorted(rows), dtype=np.int64)
+
+    def scores(self, rows: np.ndarray, vector: list) -> np.ndarray:
+        query = np.asarray(vector, dtype=np.float32)
+        query_norm = np.linalg.norm(query) or 1.0
+        norms = self.norms[rows]
+        norms[norms == 0] = 1.0
+        return (self.vectors[rows] @ query) / (norms * query_norm)
+
+    def hit(self, row: int, score: float) -> dict:
+        return {"id": self.ids[row], "score": float(score), "payload": dict(self.payloads[row])}
+
+
+class NumpyVectorStore(VectorStore):
+    """
+    Embedded vector store: brute-force cosine search over memory-mapped float32
+    matrices in VECTOR_STORE_PATH, with inverted indexes on owner_id and
+    document_id so filtered searches only touch the tenant's rows.
+    Meant for tests, offline benchmarks and small single-box deployments;
+    there is no sparse vector, so hybrid search uses the two-leg merge.
+    """
+
+    def __init__(self, path=None, dim: int = None):
+        self.root = Path(path or settings.VECTOR_STORE_PATH)
+        self.dim = dim or settings.VECTOR_SIZE
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, name: str) -> _Collection:
+        with self._lock:
+            if name not in self._collections:
+                self.root.mkdir(parents=True, exist_ok=True)
+                self._collections[name] = _Collection(self.root, name, self.dim)
+            return self._collections[name]
+
+    def ensure_collections(self):
+        for name in (self.chunks_collection, self.documents_collection):
+            self._collection(name)
+
+    def upsert(self, collection, points):
+        if not points:
+            return []
+        coll = self._collection(collection)
+        with coll.writing():
+            return coll.upsert(points)
+
+    def search(self, collection, vector, top_k=10, filters=None, score_threshold=None,
+               group_by=None, group_size=3, **options):
+        coll = self._collection(collection)
+        with coll.reading():
+            rows = coll.rows_matching(filters)
+            if not len(rows):
+                return []
+            scores = coll.scores(rows, vector)
+            if score_threshold is not None:
+                keep = scores >= score_threshold
+                rows, scores = rows[keep], scores[keep]
+
+            if not group_by:
+                if len(rows) > top_k:
+                    top = np.argpartition(-scores, top_k - 1)[:top_k]
+                else:
+                    top = np.arange(len(rows))
+                top = top[np.argsort(-scores[top], kind="stable")]
+                return [coll.hit(rows[i], scores[i]) for i in top]
+
+            groups = {}
+            for i in np.argsort(-scores, kind="stable"):
+                key = coll.payloads[rows[i]].get(group_by)
+                if key not in groups:
+                    if len(groups) >= top_k:
+                        continue
+                    groups[key] = []
+                if len(groups[key]) < group_size:
+                    groups[key].append(coll.hit(rows[i], scores[i]))
+            return [{"group_id": key, "hits": hits} for key, hits in groups.items()]
+
+    def delete(self, collection, ids=None, filters=None):
+        coll = self._collection(collection)
+        with coll.writing():
+            if ids is not None:
+                coll.delete_rows(coll.rows_for_ids(ids))
+            elif filters:
+                coll.delete_rows(coll.rows_matching(filters))
+
+    def retrieve(self, collection, ids):
+        coll = self._collection(collection)
+        with coll.reading():
+            return {coll.ids[row]: coll.vectors[row].tolist() for row in coll.rows_for_ids(ids)}
+
+    def scroll(self, collection, filters=None, with_vectors=True):
+        coll = self._collection(collection)
+        with coll.reading():
+            points = [
+                {
+                    "id": coll.ids[row],
+                    "vector": coll.vectors[row].tolist() if with_vectors else None,
+                    "payload": dict(coll.payloads[row]),
+                }
+                for row in coll.rows_matching(filters)
+            ]
+        return iter(points)
@@ -0,0 +1,89 @@
+from document_manager.qdrant.qdrant_client import (
+    ahybrid_search_vectors,
+    asearch_vectors,
+    build_filter,
+    chunks_support_sparse,
+    delete_by_filter,
+    delete_vectors,
+    ensure_collection,
+    hybrid_search_vectors,
+    retrieve_vectors,
+    scroll_points,
+    search_vectors,
+    upsert_vectors,
+)
+
+from .base import VectorStore
+
+
+class QdrantVectorStore(VectorStore):
+    """
+    Remote Qdrant server (QDRANT_HOST/QDRANT_PORT); see qdrant/qdrant_client.py.
+    Supports native hybrid search when the chunks collection has the sparse vector.
+    Search options: hnsw_ef, exact, quantization.
+    """
+
+    def ensure_collections(self):
+        ensure_collection()
+
+    def supports_sparse(self):
+        return chunks_support_sparse()
+
+    def upsert(self, collection, points):
+        return upsert_vectors(points, collection_name=collection)
+
+    def search(self, collection, vector, top_k=10, filters=None, score_threshold=None,
+               group_by=None, group_size=3, **options):
+        return search_vectors(
+            query_embedding=vector,
+            top_k=top_k,
+            filter_payload=build_filter(filters),
+            group_by=group_by,
+            group_size=group_size,
+            score_threshold=score_threshold,
+            collection_name=collection,
+            **options,
+        )
+
+    def hybrid_search(self, vector, sparse, top_k=10, filters=None, score_threshold=None):
+        return hybrid_search_vectors(
+            query_embedding=vector,
+            query_sparse=sparse,
+            top_k=top_k,
+            filter_payload=build_filter(filters),
+            score_threshold=score_threshold,
+        )
+
+    async def asearch(self, collection, vector, top_k=10, filters=None, score_threshold=None,
+                      group_by=None, group_size=3, **options):
+        return await asearch_vectors(
+            query_embedding=vector,
+            top_k=top_k,
+            filter_payload=build_filter(filters),
+            group_by=group_by,
+            group_size=group_size,
+            score_threshold=score_threshold,
+            collection_name=collection,
+            **options,
+        )
+
+    async def ahybrid_search(self, vector, sparse, top_k=10, filters=None, score_threshold=None):
+        return await ahybrid_search_vectors(
+            query_embedding=vector,
+            query_sparse=sparse,
+            top_k=top_k,
+            filter_payload=build_filter(filters),
+            score_threshold=score_threshold,
+        )
+
+    def delete(self, collection, ids=None, filters=None):
+        if ids is not None:
+            delete_vectors(ids, collection_name=collection)
+        elif filters:
+            delete_by_filter(collection, build_filter(filters))
+
+    def retrieve(self, collection, ids):
+        return retrieve_vectors(ids, collection_name=collection)
+
+    def scroll(self, collection, filters=None, with_vectors=True):
+        return scroll_points(collection, build_filter(filters), with_vectors=with_vectors)
@@ -4,14 +4,18 @@ from django.http import HttpResponse
 from django.shortcuts import render,redirect
 from django.contrib.auth.decorators import login_required
 
-from document_manager.utilities.search import explain_single_document, hybrid_search, similar_documents
+from document_manager.utilities.search import explain_single_document, run_hybrid_search, similar_documents
+from document_manager.utilities.async_search import aexplain_single_document, arun_hybrid_search, asimilar_documents
+from asgiref.sync import sync_to_async
 from document_manager.utilities.services import reset_document_for_reindex
+from document_manager.utilities.search_cache import bump_index_version
+from document_manager.utilities.runtime_settings import get_runtime_setting, runtime_settings
 from document_manager.utilities.vector_utils import cosine_similarity 
 from .tasks import process_document
 from django.shortcuts import render, get_object_or_404
 from .models import Document,SearchEvent
 from .forms import DocumentUploadForm
-from .qdrant.qdrant_client import delete_document_vectors
+from .vector_store import get_vector_store
 from django.db.models import Count, Avg, Max
 import logging
 logger = logging.getLogger(__name__)
@@ -89,33 +93,77 @@ def document_search_input_panel(request):
 def document_search_result_panel(request):
 
     query = request.GET.get("q", "").strip()
-    threshold = float(request.GET.get("threshold", 0.75))
+    threshold = float(request.GET.get("threshold", get_runtime_setting("default_similarity_threshold")))
     results = []
+    degraded = False
     if query:
-        results = hybrid_search(
+        search = run_hybrid_search(
             query=query,
             user_id=request.user.id,
             threshold=threshold
         )
+        results = search["results"]
+        degraded = search["degraded"]
         top = results[0]["best_score"] if results else None
+        score_type = results[0].get("score_type", "similarity") if results else ""
         SearchEvent.objects.create(
             user=request.user,
             query=query,
             threshold=threshold,
             result_count=len(results),
             top_score=top,
+            score_type=score_type,
         )
 
     context = {
         "query":query,
         "results":results,
-        "threshold":threshold
+        "threshold":threshold,
+        "degraded":degraded,
     }
 
     print(query)
 
     return render(request, "document_manager/_search_result_panel.jinja", context=context)
 
+@login_required(login_url='/admin/login')
+async def adocument_search_result_panel(request):
+    """
+    Async version of `document_search_result_panel` for ASGI deployments (ASYNC_SEARCH_VIEWS).
+    """
+    user = await request.auser()
+    query = request.GET.get("q", "").strip()
+    threshold = float(request.GET.get("threshold", await runtime_settings.aget("default_similarity_threshold")))
+    results = []
+    degraded = False
+    if query:
+        search = await arun_hybrid_search(
+            query=query,
+            user_id=user.id,
+            threshold=threshold
+        )
+        results = search["results"]
+        degraded = search["degraded"]
+        top = results[0]["best_score"] if results else None
+        score_type = results[0].get("score_type", "similarity") if results else ""
+        await SearchEvent.objects.acreate(
+            user=user,
+            query=query,
+            threshold=threshold,
+            result_count=len(results),
+            top_score=top,
+            score_type=score_type,
+        )
+
+    context = {
+        "query":query,
+        "results":results,
+        "threshold":threshold,
+        "degraded":degraded,
+    }
+    # context processors may touch the session/user, which is sync-only
+    return await sync_to_async(render)(request, "document_manager/_search_result_panel.jinja", context=context)
+
 @login_required(login_url='/admin/login')
 def document_search_page(request):
 
@@ -148,11 +196,12 @@ def delete_document(request, document_id:int):
     except Exception as e:
         return HttpResponse(status=404)
     
-    # Delete vectors from qdrant
-    delete_document_vectors(document.id)
+    # Delete vectors from the vector store
+    get_vector_store().delete_document(document.id)
 
     #delete document
     document.delete()
+    bump_index_version(request.user.id)
 
     # Tell HTMX that something has changed
     response = HttpResponse("")
@@ -170,9 +219,11 @@ def reindex_document(request, document_id):
     except Exception as e:
         return HttpResponse(status=404)
     
-    reset_document_for_reindex(document)
+    # incremental by default; POST mode=full forces a clean rebuild
+    incremental = settings.INCREMENTAL_REINDEX and request.POST.get("mode") != "full"
+    reset_document_for_reindex(document, incremental=incremental)
 
-    process_document.delay(document.id)
+    process_document.delay(document.id, incremental=incremental)
 
     response = HttpResponse("")
     response["HX-Trigger"] = "document-reindexed"
@@ -240,11 +291,20 @@ def similar_docs_panel(request, doc_id):
         {"related": related, "document_id":doc_id},
     )
 
+@login_required(login_url='/admin/login')
+async def asimilar_docs_panel(request, doc_id):
+    related = await asimilar_documents(doc_id)
+    return await sync_to_async(render)(
+        request,
+        "document_manager/_document_similar_document.jinja",
+        {"related": related, "document_id":doc_id},
+    )
+
 @login_required(login_url='/admin/login')
 def explain_result_panel(request, doc_id):
 
     query = request.GET.get("q", "")
-    threshold = float(request.GET.get("threshold", 0.75))
+    threshold = float(request.GET.get("threshold", get_runtime_setting("default_similarity_threshold")))
 
     result = explain_single_document(
         document_id=doc_id,
@@ -257,6 +317,24 @@ def explain_result_panel(request, doc_id):
         {"explain": result},
     )
 
+@login_required(login_url='/admin/login')
+async def aexplain_result_panel(request, doc_id):
+
+    user = await request.auser()
+    query = request.GET.get("q", "")
+    threshold = float(request.GET.get("threshold", await runtime_settings.aget("default_similarity_threshold")))
+
+    result = await aexplain_single_document(
+        document_id=doc_id,
+        query=query,
+        threshold=threshold,
+        user_id=user.id,
+    )
+
+    return await sync_to_async(render)(request, "document_manager/_explain_result_panel.jinja",
+        {"explain": result},
+    )
+
 @login_required(login_url='/admin/login')
 def explain_doc_similarity(request, doc_a_id, doc_b_id):
 
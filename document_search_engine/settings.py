@@ -99,6 +99,8 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # parallel ingestion workers write concurrently; wait for locks instead of failing
+        'OPTIONS': {'timeout': 20},
     }
 }
 
@@ -211,22 +213,166 @@ LOGGING = {
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", 6333))
 QDRANT_API_KEY = os.getenv("QDRANT_API_KEY", None)  # if using cloud
+# gRPC is usually faster than REST for search and bulk upserts
+QDRANT_PREFER_GRPC = os.getenv("QDRANT_PREFER_GRPC", "false").lower() == "true"
+QDRANT_GRPC_PORT = int(os.getenv("QDRANT_GRPC_PORT", 6334))
+QDRANT_TIMEOUT = int(os.getenv("QDRANT_TIMEOUT", 30))
 
 CHUNKS_COLLECTION_NAME = "doc_chunks"
 DOCUMENT_COLLECTION_NAME = "documents"
+# Vector store backend: the Qdrant server, or an embedded NumPy store in VECTOR_STORE_PATH
+# ("document_manager.vector_store.numpy_store.NumpyVectorStore") for tests, offline
+# benchmarks and small single-box deployments
+VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "document_manager.vector_store.qdrant_store.QdrantVectorStore")
+VECTOR_STORE_PATH = Path(os.getenv("VECTOR_STORE_PATH", BASE_DIR / "vector_store"))
+# Bulk upserts: points per request, and whether every batch waits for the write to be applied
+QDRANT_UPSERT_BATCH_SIZE = int(os.getenv("QDRANT_UPSERT_BATCH_SIZE", 256))
+QDRANT_UPSERT_WAIT = os.getenv("QDRANT_UPSERT_WAIT", "false").lower() == "true"
+# Collection storage. Quantization: "none", "scalar" (int8, ~4x smaller) or "binary"
+# (~32x smaller, best with high-dimensional OpenAI models). Quantized vectors stay in RAM,
+# originals can live on disk and are only read to rescore the oversampled candidates.
+# Applied when a collection is created; existing collections change only through
+# `manage.py configure_vector_store`.
+QDRANT_QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none")
+QDRANT_QUANTIZATION_ALWAYS_RAM = True
+QDRANT_QUANTIZATION_RESCORE = True
+QDRANT_QUANTIZATION_OVERSAMPLING = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", 2.0))
+QDRANT_VECTORS_ON_DISK = os.getenv("QDRANT_VECTORS_ON_DISK", "false").lower() == "true"
+QDRANT_HNSW_M = int(os.getenv("QDRANT_HNSW_M", 16))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.getenv("QDRANT_HNSW_EF_CONSTRUCT", 100))
+QDRANT_HNSW_ON_DISK = False
+# Per-query defaults; None lets Qdrant use the collection's ef_construct
+QDRANT_SEARCH_HNSW_EF = int(os.environ["QDRANT_SEARCH_HNSW_EF"]) if os.getenv("QDRANT_SEARCH_HNSW_EF") else None
+QDRANT_SEARCH_EXACT = False
 
 # Celery
 BROKER_HOST= os.getenv("CELERY_BROKER_HOST","localhost")
 CELERY_BROKER_URL = f"redis://{BROKER_HOST}:6379/0"
 CELERY_RESULT_BACKEND = f"redis://{BROKER_HOST}:6379/0"
+# ingestion fans out into many short tasks; don't let one worker hoard them
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+CELERY_TASK_ACKS_LATE = True
+
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"redis://{BROKER_HOST}:6379/1",
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "IGNORE_EXCEPTIONS": True,
+        },
+        "KEY_PREFIX": "dse",
+    }
+}
 
 
 # LLM
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL","text-embedding-3-small")
 OLLAMA_EMBEDDING_MODEL = "nomic-embed-text"
-EMBEDDING_PROVIDER = "openai"
+# Used when no "embedding_provider" SiteSetting exists: "openai", "ollama" or "local"
+# (deterministic hashed character n-grams computed in-process, for load tests and benchmarks)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+LOCAL_EMBEDDING_NGRAM_RANGE = (3, 5)
 VECTOR_SIZE = 1536
+# Batched embedding requests (ingestion)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 128))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", 250000))
+# Async embedding client: concurrent batches over a pooled connection, retry on 429/5xx
+EMBEDDING_ASYNC = os.getenv("EMBEDDING_ASYNC", "true").lower() == "true"
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", 8))
+EMBEDDING_MAX_RETRIES = 5
+EMBEDDING_RETRY_BASE_DELAY = 0.5  # seconds
+EMBEDDING_RETRY_MAX_DELAY = 30
+EMBEDDING_TIMEOUT = 60
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+# Shared (redis) token-bucket limits per provider; ingestion leaves a reserved share for search queries
+EMBEDDING_RATE_LIMIT_ENABLED = os.getenv("EMBEDDING_RATE_LIMIT_ENABLED", "true").lower() == "true"
+EMBEDDING_RATE_LIMITS = {
+    "openai": {
+        "rpm": int(os.getenv("OPENAI_EMBEDDING_RPM", 3000)),
+        "tpm": int(os.getenv("OPENAI_EMBEDDING_TPM", 1000000)),
+    },
+}
+EMBEDDING_INTERACTIVE_RESERVE = 0.2  # fraction of each bucket only interactive queries may use
+EMBEDDING_RATE_LIMIT_MAX_SLEEP = 2  # seconds between re-checks while throttled
+# Content-addressed embedding cache (in-process LRU in front of redis)
+EMBEDDING_CACHE_ALIAS = "default"
+EMBEDDING_CACHE_LOCAL_SIZE = int(os.getenv("EMBEDDING_CACHE_LOCAL_SIZE", 5000))
+EMBEDDING_CACHE_TTL = 60 * 60 * 24 * 30
+# Search-query embeddings (normalized query + provider + model)
+QUERY_EMBEDDING_CACHE_LOCAL_SIZE = 2000
+QUERY_EMBEDDING_CACHE_TTL = 60 * 60 * 24
 DEFAULT_SIMILARITY_THRESHOLD = 0.75
 
+# Runtime settings: SiteSetting rows (embedding_provider, default_similarity_threshold,
+# chunking_mode, chunk_*) override the matching constants here. Each process
+# caches them and re-checks a redis version stamp at most every interval (seconds).
+RUNTIME_SETTINGS_CACHE_ALIAS = "default"
+RUNTIME_SETTINGS_CHECK_INTERVAL = 1.0
+
+# Where semantic_search gets chunk text/title for hits: "db" (one query per search)
+# or "payload" (Qdrant payload, needs QDRANT_STORE_CHUNK_TEXT at ingestion; falls back to db)
+SEARCH_HYDRATION = os.getenv("SEARCH_HYDRATION", "db")
+# chunk text in the vector payload is only read by "payload" hydration; store it only then by default
+QDRANT_STORE_CHUNK_TEXT = os.getenv(
+    "QDRANT_STORE_CHUNK_TEXT", "true" if SEARCH_HYDRATION == "payload" else "false"
+).lower() == "true"
+
+# Keyword leg of hybrid search: SQLite FTS5 + BM25 (see migration 0004), or the icontains scan
+KEYWORD_SEARCH_BACKEND = (
+    "document_manager.utilities.keyword_index.SQLiteFTS5Backend"
+    if DATABASES["default"]["ENGINE"] == "django.db.backends.sqlite3"
+    else "document_manager.utilities.keyword_index.IcontainsBackend"
+)
+
+# "native": one Qdrant query with dense + sparse prefetch fused by RRF (needs QDRANT_SPARSE_ENABLED
+# when the chunks collection was created); "merge": Qdrant dense search + keyword backend merged in Python
+HYBRID_SEARCH_MODE = os.getenv("HYBRID_SEARCH_MODE", "native")
+HYBRID_PREFETCH_FACTOR = 3  # each prefetch leg returns top_k * factor candidates
+QDRANT_SPARSE_ENABLED = os.getenv("QDRANT_SPARSE_ENABLED", "true").lower() == "true"
+
+# Two-stage semantic search: pick the SEARCH_TWO_STAGE_CANDIDATES documents whose centroid
+# is closest to the query, then search only their chunks. Documents indexed before
+# centroids carried owner_id need a reindex to be found in this mode.
+SEARCH_TWO_STAGE = os.getenv("SEARCH_TWO_STAGE", "false").lower() == "true"
+SEARCH_TWO_STAGE_CANDIDATES = 100
+
+# Serve the search, explain and similar-documents panels with async views; enable when
+# running under ASGI (uvicorn workers), leave off for WSGI/gunicorn sync workers
+ASYNC_SEARCH_VIEWS = os.getenv("ASYNC_SEARCH_VIEWS", "false").lower() == "true"
+
+# Search legs run concurrently; a leg slower than this (seconds) is dropped and results are marked degraded
+SEARCH_LEG_TIMEOUT = float(os.getenv("SEARCH_LEG_TIMEOUT", 2.0))
+SEARCH_LEG_WORKERS = 16
+SEARCH_KEYWORD_LEG_WORKERS = 8  # separate pool, so keyword legs never wait for embedding legs
+# Keyword fallback of native hybrid mode. "after": the FTS query runs only once the native leg
+# failed or missed SEARCH_LEG_TIMEOUT, so healthy searches never touch the database, but a degraded
+# one can take up to twice the timeout. "concurrent": it runs alongside every native search, so
+# degraded searches still answer within one timeout at the cost of one FTS query per search.
+SEARCH_KEYWORD_FALLBACK = os.getenv("SEARCH_KEYWORD_FALLBACK", "after")
+
+# Hybrid search results, cached per user and invalidated by an index version counter
+SEARCH_RESULT_CACHE_ENABLED = True
+SEARCH_RESULT_CACHE_ALIAS = "default"
+SEARCH_RESULT_CACHE_TTL = 60 * 10
+
+# Ingestion
+# "chars" sizes chunks by characters, "tokens" by embedding-model tokens
+CHUNKING_MODE = os.getenv("CHUNKING_MODE", "chars")
+CHUNK_MAX_CHARS = 1200
+CHUNK_OVERLAP_CHARS = 200
+CHUNK_MAX_TOKENS = 300
+CHUNK_OVERLAP_TOKENS = 50
+CHUNK_BULK_BATCH_SIZE = 500  # rows per bulk_create / bulk_update statement
+INDEXING_PROGRESS_STEP = 5  # minimum progress change (percent) before it is saved
+INGEST_WINDOW_CHUNKS = 256  # chunks extracted, embedded and stored per streaming window
+CONTENT_TEXT_MAX_CHARS = 1_000_000  # text kept on Document.content_text for display
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", 100))
+# Documents with more embedding batches than this go to INGEST_BULK_QUEUE (if set)
+INGEST_BULK_QUEUE = os.getenv("INGEST_BULK_QUEUE", "")
+INGEST_BULK_THRESHOLD_BATCHES = 8
+INCREMENTAL_REINDEX = True  # reindex re-embeds only chunks whose content changed
+
 
 